@@ -1,27 +1,51 @@
+import time
+START_TIME = time.perf_counter()  # Startup is timed from here, before the imports
 import tkinter as tk
 from tkinter import messagebox, filedialog
 from PIL import Image, ImageTk
-import cv2
+import importlib
 import os
-from util import extract_video_properties, find_slopes
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
+import queue
+import threading
+from util import extract_video_properties, video_fps, read_frame_at, expand_limits, equation_image, scaled_image
 import numpy as np
-from scipy.signal import find_peaks
-from components import ChargeCalculator
+from components import ChargeCalculator, ChargeHistogram, FrameReader, FrameCache, FramePrefetcher, TRACKER_TYPES, MultiDropletTracker, TrajectoryStore, AnalysisEngine, ResultCache, DropletDetector, BlitManager, StageTimer, VideoCatalog, VideoExporter, render_trajectory
 from tkinter.ttk import Progressbar
 
+# cv2, matplotlib and scipy take longer to import than the rest of the window takes to build;
+# they are imported after the window is up, or when first needed
+DEFERRED_IMPORTS = ('cv2', 'matplotlib.figure', 'matplotlib.backends.backend_tkagg', 'scipy.signal')
+
+# Equations of the instruction pages: page -> [(mathtext, (width, height) of the box in pixels, grid pady)]
+PAGE_EQUATIONS = {
+    1: [
+        (r"$6 \pi \eta r v_t = \frac{4}{3} \pi r^3 (\rho_{\text{oil}} - \rho_{\text{air}}) \cdot g$", (300, 100), (130, 80)),
+        (r"$r = \sqrt{\frac{9 \eta v_t}{2 g (\rho_{\text{oil}} - \rho_{\text{air}})}}$", (300, 100), (330, 80)),
+    ],
+    2: [
+        (r"$q \cdot E = 6 \pi \eta r v_u + \frac{4}{3} \pi r^3 (\rho_{\text{oil}} - \rho_{\text{air}}) \cdot g$", (500, 100), (80, 80)),
+        (r"$q \cdot \frac{V}{d} = 6 \pi \eta r v_u + \frac{4}{3} \pi r^3 (\rho_{\text{oil}} - \rho_{\text{air}}) \cdot g$", (500, 100), (250, 200)),
+        (r"$q = \frac{6 \pi \eta r v_u + \frac{4}{3} \pi r^3 (\rho_{\text{oil}} - \rho_{\text{air}}) \cdot g}{\left(\frac{V}{d}\right)}$", (300, 100), (380, 50)),
+    ],
+}
+
 class MillikanExperimentApp:
 
     def __init__(self, root):
         self.root = root
         self.root.title("Millikan Experiment")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.current_page = 0 
         self.charge_calculator = ChargeCalculator()
 
         # Video and Tracker Variables
         self.video = None
-        self.tracker = cv2.TrackerCSRT_create()
+        self.tracker_type = tk.StringVar(root, value="CSRT")
+        self.multi_droplet = tk.BooleanVar(root, value=False)
+        self.multi_tracker = MultiDropletTracker(distance=100, prominence=100)
+        self.droplets = self.multi_tracker.droplets
+        self.droplet_detector = DropletDetector()
+        self.max_auto_droplets = 3  # Droplets seeded by Auto Detect in multiple droplet mode
         self.current_frame = 0
         self.total_frames = 0
         self.frame_width = 0
@@ -29,23 +53,56 @@ class MillikanExperimentApp:
         self.display_width = 512 
         self.display_height = 512
 
+        # Background decode thread feeding playback
+        self.frame_reader = None
+        self.frame_queue_depth = 8
+
+        # Decoded frames around current_frame for stepping and scrubbing
+        self.frame_cache = FrameCache(max_bytes=256 * 1024 * 1024)
+        self.frame_prefetcher = None
+        self.video_position = None  # Next frame self.video will decode, None if unknown
+
+        # Per-stage timings of playback, only collected while "Show timings" is checked
+        self.stage_timer = StageTimer()
+        self.show_timings = tk.BooleanVar(root, value=False)
+        self.timing_overlay_interval = 0.5  # Seconds between overlay refreshes
+        self.last_timing_overlay = 0.0
+
+        # Monte Carlo error bar on the charge gauge, only computed while "Show uncertainty" is checked
+        self.show_uncertainty = tk.BooleanVar(root, value=False)
+        self.uncertainty_samples = 100_000
+
+        # Annotated video written to output/<video>/annotated.mp4 while "Export video" is checked
+        self.export_video = tk.BooleanVar(root, value=False)
+        self.video_exporter = None
+
         self.roi_selection = False
-        self.bbox = None
-        self.bbox_history = {}
         self.start_x = self.start_y = self.end_x = self.end_y = 0
 
         self.paused = True
         self.video_path = None
         self.output_path = None
+        self.trajectory_path = None
         self.canvas_image = None
+        self.reset_display()
         self.video_directory = "input" 
 
-        self.y_centers = []
-        self.charge_integer_pairs = []
+        # Batch estimates of q/e, on fixed bins centered on multiples of a quarter
+        self.charge_histogram = ChargeHistogram(bin_width=0.25)
 
         # Batch size for updates
         self.batch_size = 50
-        self.batch_y_centers = []
+
+        # Finished analyses are reloaded from the result cache instead of being tracked again
+        self.analysis_engine = AnalysisEngine(
+            display_width=self.display_width,
+            display_height=self.display_height,
+            batch_size=self.batch_size,
+            distance=100,
+            prominence=100,
+            cache=ResultCache(),
+        )
+        self.pending_cache_key = None  # Set while an uninterrupted run from the initial ROIs is playing
 
         # GUI Layout
 
@@ -62,6 +119,14 @@ class MillikanExperimentApp:
 
         self.video_listbox = tk.Listbox(self.left_frame, width=30)
         self.video_listbox.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
+        self.video_listbox.bind("<<ListboxSelect>>", self.preview_video)
+
+        # Thumbnail and metadata of the highlighted video, from the catalog
+        self.video_preview = tk.Label(self.left_frame, bg="lightgray", compound=tk.TOP, justify="left")
+        self.video_preview.pack(padx=10, fill=tk.X)
+        self.catalog = None
+        self.catalog_names = []  # File name of every listbox row
+        self.catalog_queue = None  # Entries probed by the catalog thread, shown by poll_catalog
 
         self.load_videos_button = tk.Button(self.left_frame, text="Load Videos", command=self.load_videos)
         self.load_videos_button.pack(pady=5)
@@ -104,6 +169,32 @@ class MillikanExperimentApp:
         self.fast_backward_button = tk.Button(self.controls_frame, text="Fast Backward", command=self.move_fast_backward, state=tk.DISABLED)
         self.fast_backward_button.pack(fill=tk.X, pady=5)
 
+        # Tracker backend, applied when the next ROI is drawn
+        self.tracker_label = tk.Label(self.controls_frame, text="Tracker")
+        self.tracker_label.pack(fill=tk.X, pady=(15, 0))
+        self.tracker_menu = tk.OptionMenu(self.controls_frame, self.tracker_type, *TRACKER_TYPES)
+        self.tracker_menu.pack(fill=tk.X, pady=5)
+
+        # When checked, every ROI drawn adds a droplet instead of replacing the current one
+        self.multi_droplet_check = tk.Checkbutton(self.controls_frame, text="Multiple droplets", variable=self.multi_droplet)
+        self.multi_droplet_check.pack(fill=tk.X, pady=5)
+
+        # Seeds the trackers from detected droplets instead of a drawn ROI
+        self.auto_detect_button = tk.Button(self.controls_frame, text="Auto Detect", command=self.auto_detect, state=tk.DISABLED)
+        self.auto_detect_button.pack(fill=tk.X, pady=5)
+
+        # Live stage timings over the video, exported to timings.csv on pause and at the end
+        self.show_timings_check = tk.Checkbutton(self.controls_frame, text="Show timings", variable=self.show_timings, command=self.toggle_timings)
+        self.show_timings_check.pack(fill=tk.X, pady=5)
+
+        # Error bar from the velocity fits and the apparatus tolerances in ChargeCalculator.uncertainties
+        self.show_uncertainty_check = tk.Checkbutton(self.controls_frame, text="Show uncertainty", variable=self.show_uncertainty)
+        self.show_uncertainty_check.pack(fill=tk.X, pady=5)
+
+        # Frames go to a writer thread; exportVideo.py re-renders a saved session without tracking
+        self.export_video_check = tk.Checkbutton(self.controls_frame, text="Export video", variable=self.export_video)
+        self.export_video_check.pack(fill=tk.X, pady=5)
+
         # Slider for video scrubbing
         self.slider = tk.Scale(
             self.video_container,
@@ -144,19 +235,11 @@ class MillikanExperimentApp:
 
         
         ###########################
-        # Add visual element (Image)
+        # Add visual element (Image); the second image and the equations are built when their page is first shown
+        self.image_cache_dir = os.path.join('output', 'image_cache')  # Resized images and rendered equations
         self.add_visual_element()
-        self.add_visual_element2()
-        # Add eq 1
-        self.add_equation_widget()
-        # Add eq 2 
-        self.add_equation_widget2()
-        # Add eq 3
-        self.add_equation_widget3()
-        # Add eq 4
-        self.add_equation_widget4()
-        # Add eq 5
-        self.add_equation_widget5()
+        self.image_label2 = None
+        self.equation_labels = {}  # page -> labels showing its equations
         ###########################
 
         # Back Button (bottom-left of instructions grid)
@@ -237,13 +320,10 @@ class MillikanExperimentApp:
         
 
         # Chart (Bottom Left)
-        self.chart_frame = tk.Frame(self.right_frame)
+        # Sized like the chart, which build_charts adds when the first video is selected
+        self.chart_frame = tk.Frame(self.right_frame, width=400, height=300)
         self.chart_frame.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
-
-        self.figure = Figure(figsize=(4, 3), dpi=100)
-        self.ax = self.figure.add_subplot(111)
-        self.chart_canvas = FigureCanvasTkAgg(self.figure, self.chart_frame)
-        self.chart_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.figure = None
 
         # Charge Prediction Frame
         self.prediction_frame = tk.Frame(self.right_frame, bg="white")
@@ -263,6 +343,43 @@ class MillikanExperimentApp:
         self.prediction_sub_frame = tk.Frame(self.prediction_frame, bg="white")
         # self.prediction_sub_frame.pack(fill=tk.BOTH, expand=True)
 
+        # Charts keep their artists and only redraw what changed, at most every chart_render_interval
+        self.chart_render_interval = 0.25  # Seconds, independent of the batch size
+        self.chart_render_pending = False
+        self.last_chart_render = 0.0
+
+        # Configure row and column weights for dynamic resizing
+        self.right_frame.grid_rowconfigure(0, weight=1)
+        self.right_frame.grid_rowconfigure(1, weight=1)
+        self.right_frame.grid_columnconfigure(0, weight=1)
+        self.right_frame.grid_columnconfigure(1, weight=1)
+
+        # Configure the layout for dynamic resizing
+        self.video_container.grid_rowconfigure(0, weight=1)  # Video canvas and controls
+        self.video_container.grid_rowconfigure(1, weight=0)  # Slider
+        self.video_container.grid_columnconfigure(0, weight=1)  # Video canvas
+        self.video_container.grid_columnconfigure(1, weight=0)  # Controls frame
+
+        self.root.after_idle(self.finish_startup)
+
+    def finish_startup(self):
+        """Report how long the window took to become interactive, then import what was deferred."""
+        print(f"Startup: window interactive after {(time.perf_counter() - START_TIME) * 1000:.0f} ms")
+        threading.Thread(target=import_deferred_modules, name="DeferredImports", daemon=True).start()
+        # The default directory lists straight away from its catalog
+        if os.path.isdir(self.video_directory):
+            self.open_catalog(self.video_directory)
+
+    def build_charts(self):
+        """Create the chart, gauge and histogram figures, once."""
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+
+        self.figure = Figure(figsize=(4, 3), dpi=100)
+        self.ax = self.figure.add_subplot(111)
+        self.chart_canvas = FigureCanvasTkAgg(self.figure, self.chart_frame)
+        self.chart_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
         # Vertical Gauge for Charge
         self.gauge_figure = Figure(figsize=(2.5, 3), dpi=100)
         self.gauge_ax = self.gauge_figure.add_subplot(111)
@@ -279,22 +396,15 @@ class MillikanExperimentApp:
             side=tk.RIGHT, padx=5, pady=5, fill=tk.BOTH, expand=False 
         )
 
-        # Configure row and column weights for dynamic resizing
-        self.right_frame.grid_rowconfigure(0, weight=1)
-        self.right_frame.grid_rowconfigure(1, weight=1)
-        self.right_frame.grid_columnconfigure(0, weight=1)
-        self.right_frame.grid_columnconfigure(1, weight=1)
-
-        # Configure the layout for dynamic resizing
-        self.video_container.grid_rowconfigure(0, weight=1)  # Video canvas and controls
-        self.video_container.grid_rowconfigure(1, weight=0)  # Slider
-        self.video_container.grid_columnconfigure(0, weight=1)  # Video canvas
-        self.video_container.grid_columnconfigure(1, weight=0)  # Controls frame
+        self.chart_blit = BlitManager(self.chart_canvas)
+        self.gauge_blit = BlitManager(self.gauge_chart_canvas)
+        self.integer_blit = BlitManager(self.integer_chart_canvas)
 
     def load_videos(self):
         """Load video files from a user-selected directory into the Listbox."""
         self.highlight_button(self.load_videos_button)
         self.video_listbox.delete(0, tk.END)
+        self.catalog_names = []
 
         # Open a dialog for the user to select a folder
         selected_directory = filedialog.askdirectory(title="Select Video Directory")
@@ -302,29 +412,96 @@ class MillikanExperimentApp:
             return
 
         self.video_directory = selected_directory
-
-        # List videos in the selected directory
-        videos = [f for f in os.listdir(self.video_directory) if f.lower().endswith(('.mp4', '.avi', '.mov'))]
-        if not videos:
+        if not self.open_catalog(self.video_directory):
             messagebox.showinfo("No Videos Found", "No video files were found in the selected directory.")
-            return
 
-        for video in videos:
-            self.video_listbox.insert(tk.END, video)
+    def open_catalog(self, directory):
+        """List the videos of `directory` from its catalog, then probe new and changed ones in the background.
+
+        Returns False when the directory has no videos.
+        """
+        self.catalog = VideoCatalog(directory)
+        self.catalog_names = self.catalog.names()
+        self.video_listbox.delete(0, tk.END)
+        for name in self.catalog_names:
+            entry = self.catalog.get(name) if self.catalog.is_current(name) else None
+            self.video_listbox.insert(tk.END, self.catalog_label(name, entry))
+        if not self.catalog_names:
+            return False
+
+        self.catalog_queue = queue.Queue()
+        threading.Thread(target=refresh_catalog, args=(self.catalog, self.catalog_queue), name="VideoCatalog", daemon=True).start()
+        self.root.after(50, self.poll_catalog, self.catalog_queue)
+        return True
+
+    def catalog_label(self, name, entry):
+        if entry is None:
+            return f"{name}  (probing...)"
+        if entry['error']:
+            return f"{name}  ({entry['error'].lower()})"
+        return f"{name}  {entry['duration']:.0f} s, {entry['frames']} frames"
+
+    def poll_catalog(self, entries):
+        """Show the entries probed since the last poll; stops after the last one or when another directory was opened."""
+        if entries is not self.catalog_queue:
+            return
+        while True:
+            try:
+                entry = entries.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                return
+            if entry['name'] in self.catalog_names:
+                index = self.catalog_names.index(entry['name'])
+                selected = index in self.video_listbox.curselection()
+                self.video_listbox.delete(index)
+                self.video_listbox.insert(index, self.catalog_label(entry['name'], entry))
+                if selected:
+                    self.video_listbox.selection_set(index)
+        self.root.after(50, self.poll_catalog, entries)
+
+    def selected_video_name(self):
+        """File name of the selected listbox row, None without a selection."""
+        selected_index = self.video_listbox.curselection()
+        if not selected_index:
+            return None
+        if self.catalog_names:
+            return self.catalog_names[selected_index[0]]
+        return self.video_listbox.get(selected_index)
+
+    def preview_video(self, event=None):
+        """Show the thumbnail and metadata of the highlighted video."""
+        name = self.selected_video_name()
+        entry = self.catalog.get(name) if self.catalog is not None and name is not None else None
+        if entry is None or entry['error']:
+            self.video_preview.config(image="", text="")
+            return
+        thumbnail = self.catalog.thumbnail_path(entry)
+        self.preview_image = ImageTk.PhotoImage(Image.open(thumbnail)) if thumbnail and os.path.exists(thumbnail) else ""
+        self.video_preview.config(
+            image=self.preview_image,
+            text=f"{entry['width']}x{entry['height']}, {entry['fps']:.2f} fps\n{entry['frames']} frames, {entry['duration']:.1f} s",
+        )
 
     def select_video(self):
         """Handle video selection from the Listbox."""
+        import cv2
+
         self.highlight_button(self.select_video_button)
-        selected_index = self.video_listbox.curselection()
-        if not selected_index:
+        selected_video = self.selected_video_name()
+        if selected_video is None:
             messagebox.showerror("Error", "No video selected.")
             return
         
         # Reset states
         self.reset_states()
 
-        selected_video = self.video_listbox.get(selected_index)
         self.video_path = os.path.join(self.video_directory, selected_video)
+        entry = self.catalog.get(selected_video) if self.catalog is not None else None
+        if entry is not None and entry['hash'] and self.catalog.is_current(selected_video):
+            # The catalog already hashed the video, the result cache does not have to read it again
+            self.analysis_engine.cache.set_fingerprint(self.video_path, entry['hash'], entry['size'], entry['mtime'])
 
         # Set up video properties
         self.video = cv2.VideoCapture(self.video_path)
@@ -334,11 +511,14 @@ class MillikanExperimentApp:
 
         # Extract video properties
         self.total_frames, self.frame_width, self.frame_height = extract_video_properties(self.video)
+        self.multi_tracker.fps = video_fps(self.video)  # Velocities use the video's real frame rate
+        self.multi_tracker.total_frames = self.total_frames
 
         # Prepare output directory
         base_name = os.path.basename(self.video_path).split('.')[0]
         self.output_path = os.path.join('output', base_name)
         os.makedirs(self.output_path, exist_ok=True)
+        self.trajectory_path = os.path.join(self.output_path, 'trajectory')
 
         # Enable controls
         self.play_button.config(state=tk.NORMAL)
@@ -347,14 +527,22 @@ class MillikanExperimentApp:
         self.backward_button.config(state=tk.NORMAL)
         self.fast_forward_button.config(state=tk.NORMAL)
         self.fast_backward_button.config(state=tk.NORMAL)
+        self.auto_detect_button.config(state=tk.NORMAL)
 
         # Read the first frame
         ret, self.frame = self.video.read()
         if ret:
             self.current_frame = 0
+            self.video_position = 1
             self.frame = cv2.resize(self.frame, (self.display_width, self.display_height))
+            self.frame_cache.put(self.current_frame, self.frame)
             self.display_frame(self.frame)
 
+            self.frame_prefetcher = FramePrefetcher(
+                self.video_path, self.frame_cache, size=(self.display_width, self.display_height)
+            ).start()
+            self.frame_prefetcher.request(self.current_frame, 1)
+
             if self.slider is not None:
                 self.slider.config(to=self.total_frames - 1)  # Set slider range
                 self.slider.set(self.current_frame)
@@ -363,6 +551,15 @@ class MillikanExperimentApp:
             self.video_canvas.bind("<ButtonPress-1>", self.on_mouse_down)
             self.video_canvas.bind("<B1-Motion>", self.on_mouse_drag)
             self.video_canvas.bind("<ButtonRelease-1>", self.on_mouse_up)
+
+            # Offer to continue a previous session of this video instead of retracking it
+            stores = TrajectoryStore.open_all(self.trajectory_path)
+            if any(len(store) for store in stores):
+                last_frame = max(int(store.read()['frame'][-1]) for store in stores if len(store))
+                if messagebox.askyesno("Resume Tracking", f"Saved tracking found up to frame {last_frame}. Resume from there?"):
+                    self.resume_tracking(stores)
+                else:
+                    TrajectoryStore.remove_all(self.trajectory_path)
         else:
             messagebox.showerror("Error", "Could not read the first frame of the video")
     
@@ -378,39 +575,23 @@ class MillikanExperimentApp:
             self.image_label.grid_remove()  # Hide the image on other pages
         
         if self.current_page == 3:
+            if self.image_label2 is None:
+                self.add_visual_element2()
             self.image_label2.grid()  # Show the image on the first page
-        else:
+        elif self.image_label2 is not None:
             self.image_label2.grid_remove()  # Hide the image on other pages
         
-        # Show/hide equation
-        if self.current_page == 1: 
-            # Example: On page 1, display the equation
-            self.set_equation_text(r"$6 \pi \eta r v_t = \frac{4}{3} \pi r^3 (\rho_{\text{oil}} - \rho_{\text{air}}) \cdot g$")
-            self.equation_widget.grid()
-            
-            self.set_equation_text2(r"$r = \sqrt{\frac{9 \eta v_t}{2 g (\rho_{\text{oil}} - \rho_{\text{air}})}}$") 
-            self.equation_widget2.grid()
-        else:
-            self.equation_widget.grid_remove()
-            self.equation_widget2.grid_remove()
-        
-        if self.current_page == 2:
-            self.set_equation_text3(r"$q \cdot E = 6 \pi \eta r v_u + \frac{4}{3} \pi r^3 (\rho_{\text{oil}} - \rho_{\text{air}}) \cdot g$")
-            self.equation_widget3.grid()
-            
-            self.set_equation_text4(r"$q \cdot \frac{V}{d} = 6 \pi \eta r v_u + \frac{4}{3} \pi r^3 (\rho_{\text{oil}} - \rho_{\text{air}}) \cdot g$")
-            self.equation_widget4.grid()
-            
-            self.set_equation_text5(r"$q = \frac{6 \pi \eta r v_u + \frac{4}{3} \pi r^3 (\rho_{\text{oil}} - \rho_{\text{air}}) \cdot g}{\left(\frac{V}{d}\right)}$")
-            self.equation_widget5.grid()
-            
-        else:
-            self.equation_widget3.grid_remove()
-            self.equation_widget4.grid_remove()
-            self.equation_widget5.grid_remove()
-           
-            
-            
+        # Show/hide equations
+        for page, labels in self.equation_labels.items():
+            if page != self.current_page:
+                for label in labels:
+                    label.grid_remove()
+        if self.current_page in PAGE_EQUATIONS:
+            if self.current_page not in self.equation_labels:
+                self.add_equation_labels(self.current_page)
+            for label in self.equation_labels[self.current_page]:
+                label.grid()
+
         # Enable or disable buttons based on the current page
         if self.current_page == 0:
             self.back_button.config(state=tk.DISABLED)  # Disable back on the first page
@@ -439,7 +620,7 @@ class MillikanExperimentApp:
     def add_visual_element(self):
         """Add an image to the instructions frame."""
         image_path = os.path.join('media', 'millikanApparatus.png')
-        image = Image.open(image_path).resize((400, 300), Image.Resampling.LANCZOS)  # Resize image
+        image = Image.open(scaled_image(image_path, (400, 300), self.image_cache_dir))  # Resized once, then cached
         self.image_tk = ImageTk.PhotoImage(image)  # Keep a reference to avoid garbage collection
 
         # Create a label for the image
@@ -449,7 +630,7 @@ class MillikanExperimentApp:
     def add_visual_element2(self):
         """Add a second image to the instructions frame."""
         image_path = os.path.join('media', 'Charge_vs_Integer_Multiple.png')
-        image2 = Image.open(image_path).resize((500, 400), Image.Resampling.LANCZOS)  # Resize image
+        image2 = Image.open(scaled_image(image_path, (500, 400), self.image_cache_dir))  # Resized once, then cached
         self.image_tk2 = ImageTk.PhotoImage(image2)  # Keep a separate reference to avoid garbage collection
 
         # Create a label for the second image
@@ -458,178 +639,62 @@ class MillikanExperimentApp:
         
         
 
-    def add_equation_widget(self):
-        """Create the matplotlib figure to display a LaTeX equation, then hide it initially."""
-        self.equation_figure = Figure(figsize=(3, 1), dpi=100) #(Width, Height)
-        self.equation_ax = self.equation_figure.add_subplot(111)
-        self.equation_ax.axis('off')  # Hide axes for a cleaner look
+    def add_equation_labels(self, page):
+        """Show the equations of `page` as images, rendered once and then loaded from the equation cache."""
+        labels = []
+        for latex, (width, height), pady in PAGE_EQUATIONS[page]:
+            image = ImageTk.PhotoImage(Image.open(equation_image(latex, self.image_cache_dir)))
+            # An image label's size is in pixels; the box keeps the layout of the old figures
+            label = tk.Label(self.instructions_frame, image=image, bg="white", width=width, height=height)
+            label.image = image  # Keep a reference to avoid garbage collection
+            label.grid(row=0, column=0, columnspan=2, pady=pady, sticky="n")
+            labels.append(label)
+        self.equation_labels[page] = labels
+
+    def stop_background_threads(self):
+        """Stop the decode and prefetch threads before their VideoCaptures go away."""
+        self.stop_frame_reader()
+        if self.frame_prefetcher is not None:
+            self.frame_prefetcher.stop()
+            self.frame_prefetcher = None
+
+    def on_close(self):
+        self.stop_background_threads()
+        self.stop_video_export()
+        self.multi_tracker.shutdown()
+        self.root.destroy()
 
-        self.equation_canvas = FigureCanvasTkAgg(self.equation_figure, self.instructions_frame)
-        self.equation_widget = self.equation_canvas.get_tk_widget()
-        
-        # Position in grid, but hide initially
-        self.equation_widget.grid(row=0, column=0, columnspan=2, pady=(130,80), sticky="n")
-        self.equation_widget.grid_remove() # Hide for now   
-        
-    def set_equation_text(self, latex_equation: str):
-        """Render the LaTeX equation text in the existing matplotlib figure."""
-        # Clear old text
-        self.equation_ax.clear()
-        self.equation_ax.axis('off')
-
-        # Render the new LaTeX equation
-        self.equation_ax.text(
-            0.5, 0.5,
-            latex_equation,
-            fontsize=16,
-            ha='center',
-            va='center',
-            transform=self.equation_ax.transAxes
-        )
-        self.equation_canvas.draw()
-        
-    def add_equation_widget2(self):
-        """Create a second matplotlib figure to display another LaTeX equation, then hide it initially."""
-        self.equation_figure2 = Figure(figsize=(3, 1), dpi=100)
-        self.equation_ax2 = self.equation_figure2.add_subplot(111)
-        self.equation_ax2.axis('off')  # Hide axes for a cleaner look
-
-        self.equation_canvas2 = FigureCanvasTkAgg(self.equation_figure2, self.instructions_frame)
-        self.equation_widget2 = self.equation_canvas2.get_tk_widget()
-        
-        # Position in the grid but hide for now
-        # Adjust row/column to your liking (e.g., row=2 or row=3)
-        self.equation_widget2.grid(row=0, column=0, columnspan=2, pady=(330, 80), sticky="n")
-        self.equation_widget2.grid_remove()  # Hide initially
-    
-    def set_equation_text2(self, latex_equation: str):
-        """Render the LaTeX equation text in the second matplotlib figure."""
-        self.equation_ax2.clear()
-        self.equation_ax2.axis('off')
-
-        self.equation_ax2.text(
-            0.5, 0.5,
-            latex_equation,
-            fontsize=16,
-            ha='center',
-            va='center',
-            transform=self.equation_ax2.transAxes
-        )
-        self.equation_canvas2.draw() 
-        
-    def add_equation_widget3(self):
-        """Create a second matplotlib figure to display another LaTeX equation, then hide it initially."""
-        self.equation_figure3 = Figure(figsize=(5, 1), dpi=100)
-        self.equation_ax3 = self.equation_figure3.add_subplot(111)
-        self.equation_ax3.axis('off')  # Hide axes for a cleaner look
-
-        self.equation_canvas3 = FigureCanvasTkAgg(self.equation_figure3, self.instructions_frame)
-        self.equation_widget3 = self.equation_canvas3.get_tk_widget()
-        
-        # Position in the grid but hide for now
-        # Adjust row/column to your liking (e.g., row=2 or row=3)
-        self.equation_widget3.grid(row=0, column=0, columnspan=2, pady=(80, 80), sticky="n")
-        self.equation_widget3.grid_remove()  # Hide initially
-    
-    def set_equation_text3(self, latex_equation: str):
-        """Render the LaTeX equation text in the second matplotlib figure."""
-        self.equation_ax3.clear()
-        self.equation_ax3.axis('off')
-
-        self.equation_ax3.text(
-            0.5, 0.5,
-            latex_equation,
-            fontsize=16,
-            ha='center',
-            va='center',
-            transform=self.equation_ax3.transAxes
-        )
-        self.equation_canvas3.draw() 
-    
-    def add_equation_widget4(self):
-        """Create a second matplotlib figure to display another LaTeX equation, then hide it initially."""
-        self.equation_figure4 = Figure(figsize=(5, 1), dpi=100)
-        self.equation_ax4 = self.equation_figure4.add_subplot(111)
-        self.equation_ax4.axis('off')  # Hide axes for a cleaner look
-
-        self.equation_canvas4 = FigureCanvasTkAgg(self.equation_figure4, self.instructions_frame)
-        self.equation_widget4 = self.equation_canvas4.get_tk_widget()
-        
-        # Position in the grid but hide for now
-        # Adjust row/column to your liking (e.g., row=2 or row=3)
-        self.equation_widget4.grid(row=0, column=0, columnspan=2, pady=(250, 200), sticky="n")
-        self.equation_widget4.grid_remove()  # Hide initially
-    
-    def set_equation_text4(self, latex_equation: str):
-        """Render the LaTeX equation text in the second matplotlib figure."""
-        self.equation_ax4.clear()
-        self.equation_ax4.axis('off')
-
-        self.equation_ax4.text(
-            0.5, 0.5,
-            latex_equation,
-            fontsize=16,
-            ha='center',
-            va='center',
-            transform=self.equation_ax4.transAxes
-        )
-        self.equation_canvas4.draw() 
-    
-    def add_equation_widget5(self):
-        """Create a second matplotlib figure to display another LaTeX equation, then hide it initially."""
-        self.equation_figure5 = Figure(figsize=(3, 1), dpi=100)
-        self.equation_ax5 = self.equation_figure5.add_subplot(111)
-        self.equation_ax5.axis('off')  # Hide axes for a cleaner look
-
-        self.equation_canvas5 = FigureCanvasTkAgg(self.equation_figure5, self.instructions_frame)
-        self.equation_widget5 = self.equation_canvas5.get_tk_widget()
-        
-        # Position in the grid but hide for now
-        # Adjust row/column to your liking (e.g., row=2 or row=3)
-        self.equation_widget5.grid(row=0, column=0, columnspan=2, pady=(380, 50), sticky="n")
-        self.equation_widget5.grid_remove()  # Hide initially
-    
-    def set_equation_text5(self, latex_equation: str):
-        """Render the LaTeX equation text in the second matplotlib figure."""
-        self.equation_ax5.clear()
-        self.equation_ax5.axis('off')
-
-        self.equation_ax5.text(
-            0.5, 0.5,
-            latex_equation,
-            fontsize=16,
-            ha='center',
-            va='center',
-            transform=self.equation_ax5.transAxes
-        )
-        self.equation_canvas5.draw() 
-    
     def reset_states(self):
         """Reset all states to their initial values."""
+        self.stop_background_threads()
+        self.stop_video_export()
+        self.frame_cache.clear()
+        self.video_position = None
+        self.stage_timer.reset()
+
         # Reset variables
         self.video = None
-        self.tracker = cv2.TrackerCSRT_create()
+        self.multi_tracker.clear()
+        self.droplets = self.multi_tracker.droplets
         self.current_frame = 0
         self.total_frames = 0
         self.frame_width = 0
         self.frame_height = 0
-        self.bbox = None
-        self.bbox_history = {}
-        self.y_centers = []
-        self.charge_integer_pairs = []
-        self.batch_y_centers = []
+        self.charge_histogram.clear()
+        self.pending_cache_key = None
         self.paused = True
 
         # Reset UI components
         self.video_canvas.delete("all")
         self.canvas_image = None
+        self.reset_display()
         self.progress_bar['value'] = 0
-        self.ax.clear()
-        self.chart_canvas.draw()
-        self.gauge_ax.clear()
-        self.gauge_chart_canvas.draw()
-        self.integer_ax.clear()
-        self.integer_chart_canvas.draw()
+        if self.figure is None:
+            self.build_charts()
+        self.setup_chart()
+        self.setup_gauge()
+        self.setup_integer_chart()
+        self.render_charts()
         self.placeholder_label.pack(fill=tk.BOTH, expand=True) 
         self.prediction_sub_frame.pack_forget()
     
@@ -666,22 +731,118 @@ class MillikanExperimentApp:
             self.end_x = event.x
             self.end_y = event.y
             self.roi_selection = False
-            self.bbox = (self.start_x, self.start_y, self.end_x - self.start_x, self.end_y - self.start_y)
-            self.bbox
-            self.tracker.init(self.frame, self.bbox)
-            self.bbox_history[self.current_frame] = self.bbox
+            bbox = (self.start_x, self.start_y, self.end_x - self.start_x, self.end_y - self.start_y)
+            self.video_canvas.delete("roi")
+            self.add_droplet(bbox)
 
+        self.remove_slider()
+
+    def auto_detect(self):
+        """Seed the trackers with the best ranked droplets of the detector."""
+        if self.video is None or not self.paused:
+            return
+        self.highlight_button(self.auto_detect_button)
+        max_droplets = self.max_auto_droplets if self.multi_droplet.get() else 1
+        detections = self.droplet_detector.detect_video(
+            self.video_path, self.current_frame, (self.display_width, self.display_height), max_droplets
+        )
+        if not detections:
+            messagebox.showinfo("Auto Detect", "No droplets found, select an area on the video instead.")
+            return
+        for detection in detections:
+            self.add_droplet(detection['bbox'])
+            print(f"Detected droplet at {detection['bbox']}: score {detection['score']:.1f}")
+        self.remove_slider()
+
+    def add_droplet(self, bbox):
+        """Start tracking a droplet from `bbox` on the current frame."""
+        if not self.multi_droplet.get():
+            self.multi_tracker.clear()
+            self.video_canvas.delete("rois")
+            TrajectoryStore.remove_all(self.trajectory_path)
+        droplet = self.multi_tracker.add(self.frame, bbox, self.current_frame, self.tracker_type.get())
+        self.pending_cache_key = None
+        self.droplets = self.multi_tracker.droplets
+        self.open_trajectory_store(droplet)
+
+        # Keep every selected ROI visible until playback starts
+        x, y, w, h = bbox
+        self.video_canvas.create_rectangle(x, y, x + w, y + h, outline="blue", tag="rois")
+
+    def remove_slider(self):
         # Safely remove the slider
         if self.slider is not None:
             self.slider.pack_forget()
             self.slider.destroy()
             self.slider = None
 
+    def open_trajectory_store(self, droplet):
+        """Start a fresh on-disk trajectory for a newly selected droplet."""
+        directory = os.path.join(self.trajectory_path, f"droplet_{len(self.droplets) - 1}")
+        TrajectoryStore.remove_all(directory)
+        droplet.store = TrajectoryStore(directory, {
+            'video': os.path.basename(self.video_path),
+            'tracker': self.tracker_type.get(),
+            'start_frame': self.current_frame,
+            'initial_bbox': [float(v) for v in droplet.bbox],
+            'display_size': [self.display_width, self.display_height],
+        })
+
+    def resume_tracking(self, stores):
+        """Rebuild the droplets from their saved trajectories and continue each one after its own last frame.
+
+        Playback resumes after the earliest of those frames; droplets saved further than
+        that are not tracked again until playback gets past their last frame.
+        """
+        saved = []
+        for store in stores:
+            data = store.read()
+            last_frame = int(data['frame'][-1]) if len(store) else int(store.metadata['start_frame'])
+            saved.append((store, data, last_frame))
+
+        # Every tracker is re-initialized on the frame of its droplet's last saved box
+        frames = {}
+        for last_frame in sorted({last_frame for _, _, last_frame in saved}):
+            shown = last_frame
+            frame = self.read_display_frame(shown)
+            if frame is None and last_frame == self.total_frames - 1:
+                # The last frame of a .mov cannot be decoded after a seek; a droplet that got there has nothing left to track
+                shown = last_frame - 1
+                frame = self.read_display_frame(shown)
+            if frame is None:
+                return
+            frames[last_frame] = (shown, frame)
+
+        for store, data, last_frame in saved:
+            bbox = data['bbox'][-1] if len(store) else store.metadata['initial_bbox']
+            droplet = self.multi_tracker.add(frames[last_frame][1], tuple(int(round(v)) for v in bbox), last_frame, store.metadata['tracker'])
+            droplet.store = store
+            start_frame = store.metadata['start_frame']
+            droplet.restart_trajectory(start_frame, tuple(store.metadata['initial_bbox']), self.multi_tracker.trajectory_capacity(start_frame))
+            droplet.trajectory.extend(data['frame'], data['bbox'])
+            droplet.trajectory.flush()  # Already in the store, the detector reads it from the buffer
+        self.droplets = self.multi_tracker.droplets
+        self.current_frame = min(frames)
+        shown = frames[self.current_frame][0]
+        print(f"Resumed {len(self.droplets)} droplet(s) at frame {self.current_frame}")
+
+        self.remove_slider()
+        self.show_frame(shown)  # Redraw with the restored boxes
+        self.progress_bar['value'] = (self.current_frame / self.total_frames) * 100
+        self.update_chart(estimate=self.droplets)
+
     def play_video(self):
         if self.paused:
             self.highlight_button(self.play_button)
+            if self.load_cached_results():
+                if self.export_video.get():
+                    self.render_cached_video()
+                return
             self.video_canvas.delete("roi")
+            self.video_canvas.delete("rois")
             self.paused = False
+            if self.export_video.get() and self.video_exporter is None and self.droplets:
+                self.start_video_export()
             self.update_video_frame()
             self.play_button.config(state=tk.DISABLED)
             self.pause_button.config(state=tk.ACTIVE)
@@ -694,6 +855,8 @@ class MillikanExperimentApp:
         if not self.paused:
             self.highlight_button(self.pause_button)
             self.paused = True
+            self.stop_frame_reader()
+            self.export_timings()
             self.play_button.config(state=tk.ACTIVE)
             self.pause_button.config(state=tk.DISABLED)
             self.forward_button.config(state=tk.ACTIVE)
@@ -702,35 +865,57 @@ class MillikanExperimentApp:
             self.fast_backward_button.config(state=tk.ACTIVE)
 
     def update_video_frame(self):
-        if not self.bbox:
-            messagebox.showinfo("Missed Step","Must select an area on the video first.")
+        if not self.droplets:
+            messagebox.showinfo("Missed Step","Must select an area on the video or use Auto Detect first.")
             return
 
         if self.paused or not self.video.isOpened():
             return
 
-        ret, self.frame = self.video.read()
-        if not ret:
+        # Frames are decoded and resized ahead of time on the reader thread
+        if self.frame_reader is None:
+            self.start_frame_reader()
+        try:
+            item = self.frame_reader.get()
+        except queue.Empty:
+            # Decode is behind, check again shortly
+            self.root.after(2, self.update_video_frame)
+            return
+        if item is None:
+            self.stop_frame_reader()
+            self.process_batch_data()  # Include the trailing partial batch
+            self.store_cached_results()
+            self.export_timings()
+            self.stop_video_export()
             messagebox.showinfo("End of Video", "Video playback completed")
             return
 
-        self.frame = cv2.resize(self.frame, (self.display_width, self.display_height))
-        self.current_frame += 1
-        ret, bbox = self.tracker.update(self.frame)
-        if ret:
-            self.bbox_history[self.current_frame] = bbox
-            self.batch_y_centers.append((self.current_frame, bbox[1] + bbox[3] / 2))
-            p1 = (int(bbox[0]), int(bbox[1]))
-            p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
-            cv2.rectangle(self.frame, p1, p2, (255, 0, 0), 2, 1)
+        frame_start = self.stage_timer.start()
+        self.current_frame, self.frame = item
+        self.frame_cache.put(self.current_frame, self.frame)  # Ready for stepping back after a pause
+
+        # All droplets are tracked on the same decoded frame
+        start = self.stage_timer.start()
+        results = self.multi_tracker.update(self.frame, self.current_frame)
+        self.stage_timer.stop('track', start, self.current_frame)
 
         # Update the batch when batch size is reached
-        if len(self.batch_y_centers) >= self.batch_size:
+        if any(droplet.trajectory.pending() >= self.batch_size for droplet in self.droplets):
             self.process_batch_data()
-            self.batch_y_centers = [] 
 
         
-        self.display_frame(self.frame)
+        start = self.stage_timer.start()
+        self.display_frame(self.frame, [bbox for ret, bbox in results if ret])
+        self.stage_timer.stop('display', start, self.current_frame)
+        if self.video_exporter is not None:
+            if self.video_exporter.error is None:
+                self.video_exporter.write(self.current_frame, self.frame, [bbox if ret else None for ret, bbox in results])
+            else:
+                self.stop_video_export()
+        self.stage_timer.stop('frame', frame_start, self.current_frame)
+        if frame_start is not None:
+            self.stage_timer.end_frame()
+            self.update_timing_overlay()
 
         # Update the progress bar
         progress = (self.current_frame / self.total_frames) * 100
@@ -738,163 +923,379 @@ class MillikanExperimentApp:
 
         self.root.after(10, self.update_video_frame)
 
-    def process_batch_data(self):
-        """Process batch data using numpy for efficient computation."""
-        if len(self.batch_y_centers) == 0:
+    def start_frame_reader(self):
+        """Start decoding from the frame after the one currently shown."""
+        self.frame_reader = FrameReader(
+            self.video_path,
+            start_frame=self.current_frame + 1,
+            size=(self.display_width, self.display_height),
+            depth=self.frame_queue_depth,
+            timer=self.stage_timer,
+        ).start()
+
+    def start_video_export(self):
+        """Export the frames played from here on, starting with the one on screen."""
+        path = os.path.join(self.output_path, 'annotated.mp4')
+        try:
+            self.video_exporter = VideoExporter(path, self.multi_tracker.fps, (self.display_width, self.display_height)).start()
+        except IOError as e:
+            messagebox.showerror("Error", str(e))
             return
+        self.video_exporter.write(self.current_frame, self.frame, [droplet.bbox_at(self.current_frame) for droplet in self.droplets])
 
-        batch_array = np.array(self.batch_y_centers)
-        normalized_y_centers = batch_array[:, 1] / self.display_height
-        self.y_centers.extend(normalized_y_centers.tolist())
-        self.update_chart()
-
-    def update_chart(self):
-        """Find and plot peaks and troughs in y-center data, ensuring the first and last data points are treated as specified."""
-        y = np.array(self.y_centers) * 512  # Scale to pixel values
-        t = np.arange(len(self.y_centers))  # Time indices
-
-        # Use numpy functions to find peaks and troughs
-        peaks, _ = find_peaks(y, distance=100, prominence=100)
-        troughs, _ = find_peaks(-y, distance=100, prominence=100)
-
-        # Enforce the first and last frame conditions
-        if 0 not in troughs:
-            troughs = np.append([0], troughs)
-        if len(peaks) > 0 and len(troughs) > 0:
-            if peaks[-1] > troughs[-1]:
-                if len(y) - 1 not in troughs:
-                    troughs = np.append(troughs, [len(y) - 1])
-            else:
-                if len(y) - 1 not in peaks:
-                    peaks = np.append(peaks, [len(y) - 1])
-
-        # Create lists of tuples for peaks and troughs
-        peak_points = [(t[index], y[index]) for index in peaks]
-        trough_points = [(t[index], y[index]) for index in troughs]
+    def stop_video_export(self):
+        if self.video_exporter is None:
+            return
+        exporter, self.video_exporter = self.video_exporter, None
+        exporter.close()
+        if exporter.error is not None:
+            messagebox.showerror("Export Failed", f"Could not write {exporter.path}: {exporter.error}")
+            return
+        stats = exporter.stats()
+        print(f"Exported {stats['frames_written']} frames to {exporter.path}")
+        if stats['frames_dropped']:
+            print(f"{stats['frames_dropped']} frames were dropped while the writer caught up; "
+                  f"python exportVideo.py {self.video_path} renders them all from the saved trajectory")
+
+    def render_cached_video(self):
+        """Render the annotated video of a cached run from its trajectory store, on a background thread."""
+        path = os.path.join(self.output_path, 'annotated.mp4')
+        outcome = {}
+
+        def render(video_path, trajectory_path):
+            try:
+                outcome['frames'] = render_trajectory(video_path, trajectory_path, path)
+            except IOError as e:
+                outcome['error'] = e
+
+        thread = threading.Thread(target=render, args=(self.video_path, self.trajectory_path), name="RenderCachedVideo", daemon=True)
+        thread.start()
+        self.root.after(200, self.poll_cached_video, thread, path, outcome)
+
+    def poll_cached_video(self, thread, path, outcome):
+        if thread.is_alive():
+            self.root.after(200, self.poll_cached_video, thread, path, outcome)
+        elif 'error' in outcome:
+            messagebox.showerror("Export Failed", str(outcome['error']))
+        else:
+            print(f"Exported {outcome['frames']} frames to {path}")
 
-        try:
-            vu, vd = find_slopes(peak_points, trough_points)
-            charge, integer = self.charge_calculator.find_charge_and_integer(vu, vd)
-            self.update_prediction_display(charge, integer)
-        except ValueError as e:
-            pass
+    def stop_frame_reader(self):
+        if self.frame_reader is None:
+            return
+        self.frame_reader.stop()
+        print(f"Frame queue stats: {self.frame_reader.stats()}")
+        self.frame_reader = None
 
-        # Plotting
+    def process_batch_data(self):
+        """Process batch data using numpy for efficient computation."""
+        start = self.stage_timer.start()
+        updated = []  # Droplets with new samples, only their charge is estimated again
+        for droplet in self.droplets:
+            if droplet.trajectory.pending() == 0:
+                continue
+            frames, bboxes, y_centers = droplet.trajectory.flush()
+            if droplet.store is not None:
+                # Persist the batch so the session can be resumed later
+                droplet.store.append(frames, bboxes, y_centers)
+            updated.append(droplet)
+        self.stage_timer.stop('batch', start, self.current_frame)
+        if updated:
+            start = self.stage_timer.start()
+            self.update_chart(estimate=updated)
+            self.stage_timer.stop('chart', start, self.current_frame)
+
+    def setup_chart(self):
+        """Build the y-center chart once; update_chart only moves the data of its lines."""
         self.ax.clear()
         self.ax.set_title('Detected Peaks and Troughs in Y-Center Data')
         self.ax.set_xlabel('Frame Index')
         self.ax.set_ylabel('Y-Center Value')
         self.ax.grid(True)
-        self.ax.plot(t, y, label='Y-Center Data', color='black')
-        self.ax.plot(t[peaks], y[peaks], 'x', label='Peaks', color='blue')
-        self.ax.plot(t[troughs], y[troughs], 'bo', label='Troughs')
-        self.ax.invert_yaxis()
+        self.set_chart_frames(2 * self.batch_size)
+        self.ax.set_ylim(1, 0)  # Inverted, grows to fit the data
+        self.chart_lines = []  # (y-centers, peaks, troughs) artists per droplet
+        self.chart_blit.set_artists([])
+
+    def set_chart_frames(self, frames):
+        self.ax.set_xlim(-0.02 * frames, frames)  # Small margin so the first sample is not cut off
+
+    def add_chart_lines(self):
+        """One set of persistent artists per droplet, labelled like the original chart."""
+        self.setup_chart()
+        single = len(self.droplets) == 1
+        for index in range(len(self.droplets)):
+            line, = self.ax.plot([], [], label='Y-Center Data' if single else f'Droplet {index + 1}', color='black' if single else f'C{index}')
+            peak_markers, = self.ax.plot([], [], 'x', label='Peaks' if index == 0 else None, color='blue')
+            trough_markers, = self.ax.plot([], [], 'bo', label='Troughs' if index == 0 else None)
+            self.chart_lines.append((line, peak_markers, trough_markers))
         self.ax.legend()
-        self.chart_canvas.draw()
-
-    def display_frame(self, frame):
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(frame)
-        imgtk = ImageTk.PhotoImage(image=img)
-        if self.canvas_image is None:
-            self.canvas_image = self.video_canvas.create_image(0, 0, anchor=tk.NW, image=imgtk)
+        self.chart_blit.set_artists([artist for artists in self.chart_lines for artist in artists])
+
+    def schedule_chart_render(self):
+        """Render the charts soon, but no more than once every chart_render_interval."""
+        if self.chart_render_pending:
+            return
+        self.chart_render_pending = True
+        delay = max(0.0, self.chart_render_interval - (time.perf_counter() - self.last_chart_render))
+        self.root.after(int(delay * 1000), self.render_charts)
+
+    def render_charts(self):
+        start = self.stage_timer.start()
+        self.chart_render_pending = False
+        self.last_chart_render = time.perf_counter()
+        for blit in (self.chart_blit, self.gauge_blit, self.integer_blit):
+            if blit.dirty:
+                blit.update()
+        self.stage_timer.stop('render', start, self.current_frame)
+
+    def toggle_timings(self):
+        self.stage_timer.enabled = self.show_timings.get()
+        if not self.stage_timer.enabled and self.timing_overlay is not None:
+            self.video_canvas.delete(self.timing_overlay)
+            self.timing_overlay = None
+
+    def update_timing_overlay(self):
+        """Show mean, p95 and max per stage over the video, refreshed every timing_overlay_interval."""
+        now = time.perf_counter()
+        if now - self.last_timing_overlay < self.timing_overlay_interval:
+            return
+        self.last_timing_overlay = now
+        text = "stage     mean    p95    max\n" + self.stage_timer.summary()
+        if self.timing_overlay is None:
+            self.timing_overlay = self.video_canvas.create_text(
+                5, 5, anchor=tk.NW, text=text, fill="yellow", font=("Courier", 9), tag="timing_overlay"
+            )
         else:
-            self.video_canvas.itemconfig(self.canvas_image, image=imgtk)
-        self.video_canvas.image = imgtk
+            self.video_canvas.itemconfig(self.timing_overlay, text=text)
+
+    def export_timings(self):
+        """Write the per-frame timings collected so far to output/<video>/timings.csv."""
+        if not self.stage_timer.rows or self.output_path is None:
+            return
+        path = os.path.join(self.output_path, 'timings.csv')
+        rows = self.stage_timer.write_csv(path)
+        print(f"Wrote timings of {rows} frames to {path}")
+
+    def update_chart(self, estimate=()):
+        """Find and plot peaks and troughs in y-center data, ensuring the first and last data points are treated as specified.
+
+        The charge of the droplets in `estimate` is estimated again and added to the histogram.
+        """
+        if len(self.chart_lines) != len(self.droplets):
+            self.add_chart_lines()
+
+        for index, droplet in enumerate(self.droplets):
+            # Only the newly flushed samples are searched for peaks and troughs,
+            # the first and last frame conditions are enforced by the detector
+            peaks, troughs = droplet.extrema_detector.update()
+            y = droplet.extrema_detector.y  # Display pixels, views of the trajectory buffer
+            t = droplet.trajectory.flushed_frames()
+
+            if droplet in estimate:
+                try:
+                    vu, vd = droplet.extrema_detector.velocities()
+                    charge, integer = self.charge_calculator.find_charge_and_integer(vu, vd)
+                    droplet.charge_history.append((self.current_frame, charge, integer))
+                    self.update_prediction_display(charge, integer, self.charge_uncertainty(droplet))
+                except ValueError as e:
+                    pass
+
+            # Plotting
+            line, peak_markers, trough_markers = self.chart_lines[index]
+            line.set_data(t, y)
+            peak_markers.set_data(t[peaks], y[peaks])
+            trough_markers.set_data(t[troughs], y[troughs])
+
+            # Limits only grow, so the static background is redrawn rarely
+            if len(y) == 0:
+                continue
+            if t[-1] > self.ax.get_xlim()[1]:
+                self.set_chart_frames(max(2 * self.ax.get_xlim()[1], t[-1]))
+                self.chart_blit.request_full_draw()
+            y_limits = expand_limits(self.ax.get_ylim(), y.min(), y.max())
+            if y_limits is not None:
+                self.ax.set_ylim(y_limits[1], y_limits[0])  # Keep the axis inverted
+                self.chart_blit.request_full_draw()
+
+        self.chart_blit.dirty = True
+        self.schedule_chart_render()
+
+    def result_cache_key(self):
+        droplets = [(droplet.start_frame, droplet.initial_bbox, droplet.tracker_type) for droplet in self.droplets]
+        return self.analysis_engine.cache_key(self.video_path, droplets)
+
+    def load_cached_results(self):
+        """Show a finished analysis of the selected droplets from the result cache. Returns True on a hit."""
+        if not self.droplets or any(len(droplet.trajectory) for droplet in self.droplets):
+            return False  # Only whole runs from the initial ROIs are cached
+        key = self.result_cache_key()
+        results = self.analysis_engine.cache.get(key)
+        if results is None:
+            self.pending_cache_key = key
+            return False
+
+        for droplet, result in zip(self.droplets, results):
+            tracked = result['bbox_frames'] > droplet.start_frame  # The first entry is the initial ROI
+            droplet.trajectory.extend(result['bbox_frames'][tracked], result['bboxes'][tracked])
+            frames, bboxes, y_centers = droplet.trajectory.flush()
+            if droplet.store is not None:
+                # Saved like a tracked run, so the session can be resumed and re-rendered later
+                droplet.store.append(frames, bboxes, y_centers)
+            droplet.charge_history = result['charge_history']
+
+        # Same histogram as a full run: every batch estimate in frame order, the last one shown on the gauge
+        history = sorted(
+            (entry for droplet in self.droplets for entry in droplet.charge_history),
+            key=lambda entry: entry[0],
+        )
+        self.charge_histogram.clear()
+        self.charge_histogram.extend(integer for _, _, integer in history[:-1])
+        self.update_chart()
+        if history:
+            latest = max(self.droplets, key=lambda droplet: droplet.charge_history[-1][0] if droplet.charge_history else -1)
+            self.update_prediction_display(history[-1][1], history[-1][2], self.charge_uncertainty(latest))
+
+        self.current_frame = results[0]['frames'] - 1
+        self.video_canvas.delete("roi")
+        self.video_canvas.delete("rois")
+        self.show_frame(self.current_frame)
+        self.progress_bar['value'] = (self.current_frame / self.total_frames) * 100
+        return True
+
+    def store_cached_results(self):
+        if self.pending_cache_key is None:
+            return  # Rewound or resumed runs are not what a fresh run would produce
+        results = self.analysis_engine.build_results(
+            self.video_path, self.droplets, self.total_frames, self.frame_width, self.frame_height,
+            self.current_frame + 1, None, self.multi_tracker.fps,
+        )
+        self.analysis_engine.cache.put(self.pending_cache_key, results)
+        self.pending_cache_key = None
+
+    def reset_display(self):
+        self.display_buffer = None  # RGBA pixels shared with display_image
+        self.display_image = None
+        self.display_photo = None
+        self.displayed_frame = None
+        self.bbox_items = []  # Canvas rectangles reused for the tracked boxes
+        self.visible_bbox_items = 0
+        self.timing_overlay = None
+
+    def display_frame(self, frame, bboxes=()):
+        """Show a BGR frame with `bboxes` drawn as canvas rectangles over it.
+
+        The frame is converted into one preallocated buffer that backs a single PIL image
+        and PhotoImage, so no image is allocated per frame. The frame itself is never drawn
+        into, and one that is already on screen is not converted again.
+        """
+        import cv2
+
+        if frame is not self.displayed_frame:
+            height, width = frame.shape[:2]
+            if self.display_photo is None or self.display_buffer.shape[:2] != (height, width):
+                self.display_buffer = np.empty((height, width, 4), dtype=np.uint8)
+                self.display_image = Image.frombuffer('RGBA', (width, height), self.display_buffer, 'raw', 'RGBA', 0, 1)
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA, dst=self.display_buffer)
+                self.display_photo = ImageTk.PhotoImage(image=self.display_image)
+                if self.canvas_image is None:
+                    self.canvas_image = self.video_canvas.create_image(0, 0, anchor=tk.NW, image=self.display_photo)
+                    self.video_canvas.tag_lower(self.canvas_image)
+                else:
+                    self.video_canvas.itemconfig(self.canvas_image, image=self.display_photo)
+                self.video_canvas.image = self.display_photo
+            else:
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA, dst=self.display_buffer)
+                self.display_photo.paste(self.display_image)
+            self.displayed_frame = frame
+        self.draw_bboxes(bboxes)
+
+    def draw_bboxes(self, bboxes):
+        """Move one canvas rectangle per bbox into place and hide the spare ones."""
+        while len(self.bbox_items) < len(bboxes):
+            self.bbox_items.append(self.video_canvas.create_rectangle(0, 0, 0, 0, outline="blue", width=2, tag="bbox"))
+        for item, (x, y, w, h) in zip(self.bbox_items, bboxes):
+            self.video_canvas.coords(item, x, y, x + w, y + h)
+        for index in range(len(bboxes), self.visible_bbox_items):
+            self.video_canvas.itemconfig(self.bbox_items[index], state=tk.HIDDEN)
+        for index in range(self.visible_bbox_items, len(bboxes)):
+            self.video_canvas.itemconfig(self.bbox_items[index], state=tk.NORMAL)
+        self.visible_bbox_items = len(bboxes)
+
+    def read_display_frame(self, index):
+        """Frame `index` at display size, from the frame cache when possible; None if it cannot be decoded."""
+        import cv2
+
+        frame = self.frame_cache.get(index)
+        if frame is None:
+            # Neighbouring frames are reached with grab() instead of a seek
+            ret, frame = read_frame_at(self.video, index, self.video_position)
+            if not ret:
+                self.video_position = None
+                return None
+            self.video_position = index + 1
+            frame = cv2.resize(frame, (self.display_width, self.display_height))
+            self.frame_cache.put(index, frame)
+        return frame
+
+    def show_frame(self, index, direction=1):
+        """Display frame `index` with its tracked bbox, taking it from the frame cache when possible."""
+        frame = self.read_display_frame(index)
+        if frame is None:
+            return False
+        self.frame = frame
+
+        # Keep decoding ahead in the direction of travel
+        if self.frame_prefetcher is not None:
+            self.frame_prefetcher.request(index, direction)
+
+        bboxes = [bbox for bbox in (droplet.bbox_at(index) for droplet in self.droplets) if bbox is not None]
+        self.display_frame(frame, bboxes)
+        return True
 
     def move_forward(self):
         if self.current_frame < self.total_frames - 1:
             self.highlight_button(self.forward_button)
             self.current_frame += 1
-            self.video.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame)
-            ret, frame = self.video.read()
-            if ret:
-                frame = cv2.resize(frame, (self.display_width, self.display_height))
-                bbox = self.bbox_history.get(self.current_frame, None)
-                if bbox:
-                    p1 = (int(bbox[0]), int(bbox[1]))
-                    p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
-                    cv2.rectangle(frame, p1, p2, (255, 0, 0), 2, 1)
-                self.display_frame(frame)
+            self.pending_cache_key = None  # Skipped frames are not tracked
+            self.show_frame(self.current_frame, direction=1)
 
     def move_backward(self):
         if self.current_frame > 0:
             self.highlight_button(self.backward_button)
             self.current_frame -= 1
-            self.video.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame)
-            ret, frame = self.video.read()
-            if ret:
-                frame = cv2.resize(frame, (self.display_width, self.display_height))
-                bbox = self.bbox_history.get(self.current_frame, None)
-                if bbox:
-                    p1 = (int(bbox[0]), int(bbox[1]))
-                    p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
-                    cv2.rectangle(frame, p1, p2, (255, 0, 0), 2, 1)
-                self.display_frame(frame)
-                
-                # Handle data removal
-                if len(self.batch_y_centers) > 0:
-                    # Remove the last element from the batch
-                    self.batch_y_centers.pop()
-                elif len(self.y_centers) > 0:
-                    # Remove from y_centers if batch is empty
-                    self.y_centers.pop()
-                    # Remove from charge_interval_pairs only if we've gone backward by more than a batch
-                    if self.current_frame % self.batch_size == 0 and len(self.charge_integer_pairs) > 0:
-                        self.charge_integer_pairs.pop()
-                
-                # Update bbox history
-                if self.current_frame in self.bbox_history:
-                    del self.bbox_history[self.current_frame]
+            if self.show_frame(self.current_frame, direction=-1):
+                self.remove_tracked_samples()
 
 
     def move_fast_forward(self):
         if self.current_frame < self.total_frames - 1:
             self.highlight_button(self.fast_backward_button)
             self.current_frame += 10
-            self.video.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame)
-            ret, frame = self.video.read()
-            if ret:
-                frame = cv2.resize(frame, (self.display_width, self.display_height))
-                bbox = self.bbox_history.get(self.current_frame, None)
-                if bbox:
-                    p1 = (int(bbox[0]), int(bbox[1]))
-                    p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
-                    cv2.rectangle(frame, p1, p2, (255, 0, 0), 2, 1)
-                self.display_frame(frame)
+            self.pending_cache_key = None  # Skipped frames are not tracked
+            self.show_frame(self.current_frame, direction=1)
 
     def move_fast_backward(self):
         if self.current_frame > 0:
             self.highlight_button(self.fast_backward_button)
             frames_to_skip = 10  # Define how many frames to skip backward
             self.current_frame = max(0, self.current_frame - frames_to_skip)
-            self.video.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame)
-            ret, frame = self.video.read()
-            if ret:
-                frame = cv2.resize(frame, (self.display_width, self.display_height))
-                bbox = self.bbox_history.get(self.current_frame, None)
-                if bbox:
-                    p1 = (int(bbox[0]), int(bbox[1]))
-                    p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
-                    cv2.rectangle(frame, p1, p2, (255, 0, 0), 2, 1)
-                self.display_frame(frame)
-            
-            # Handle data removal
-            for _ in range(frames_to_skip):
-                if len(self.batch_y_centers) > 0:
-                    # Remove the last element from the batch
-                    self.batch_y_centers.pop()
-                elif len(self.y_centers) > 0:
-                    # Remove from y_centers if batch is empty
-                    self.y_centers.pop()
-                    # Remove from charge_interval_pairs if backward movement crosses batch boundaries
-                    if self.current_frame % self.batch_size == 0 and len(self.charge_integer_pairs) > 0:
-                        self.charge_integer_pairs.pop()
-            
-            # Update bbox history
-            for frame_idx in range(self.current_frame, self.current_frame + frames_to_skip):
-                if frame_idx in self.bbox_history:
-                    del self.bbox_history[frame_idx]
+            self.show_frame(self.current_frame, direction=-1)
+            self.remove_tracked_samples()
+
+    def remove_tracked_samples(self):
+        """Forget everything tracked after the current frame, after rewinding."""
+        self.pending_cache_key = None
+        for droplet in self.droplets:
+            droplet.trajectory.truncate(self.current_frame + 1)
+            droplet.extrema_detector.truncate(droplet.trajectory.flushed)
+            if droplet.store is not None:
+                droplet.store.truncate(droplet.trajectory.flushed)
+            # Batch estimates made after the current frame go from the histogram as well
+            while droplet.charge_history and droplet.charge_history[-1][0] > self.current_frame:
+                _, _, integer = droplet.charge_history.pop()
+                if len(self.charge_histogram):
+                    self.charge_histogram.remove(integer)
 
     def highlight_button(self, button):
         # Reset all buttons to their default style
@@ -920,20 +1321,26 @@ class MillikanExperimentApp:
         
         if self.video and not self.paused:  # Pause video if it's playing
             self.paused = True
-
-        self.current_frame = int(value)
-        self.video.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame)
-        ret, frame = self.video.read()
-        if ret:
-            frame = cv2.resize(frame, (self.display_width, self.display_height))
-            bbox = self.bbox_history.get(self.current_frame, None)
-            if bbox:
-                p1 = (int(bbox[0]), int(bbox[1]))
-                p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
-                cv2.rectangle(frame, p1, p2, (255, 0, 0), 2, 1)
-            self.display_frame(frame)
-
-    def update_prediction_display(self, charge, integer):
+            self.stop_frame_reader()
+
+        index = int(value)
+        direction = 1 if index >= self.current_frame else -1
+        if index != self.current_frame:
+            self.pending_cache_key = None
+        self.current_frame = index
+        self.show_frame(self.current_frame, direction=direction)
+
+    def charge_uncertainty(self, droplet):
+        """Monte Carlo charge interval of a droplet's current velocities, None while "Show uncertainty" is off."""
+        if not self.show_uncertainty.get():
+            return None
+        detector = droplet.extrema_detector
+        vu, vd = detector.velocities()
+        vu_std, vd_std = detector.velocity_errors()
+        uncertainty = self.charge_calculator.charge_uncertainty(vu, vd, vu_std, vd_std, samples=self.uncertainty_samples, seed=0)
+        return uncertainty if 'charge_low' in uncertainty else None
+
+    def update_prediction_display(self, charge, integer, uncertainty=None):
         """Update the gauge and bar chart with new prediction values or switch from placeholder."""
         if not charge or not integer:
             self.placeholder_label.pack(fill=tk.BOTH, expand=True)  
@@ -944,23 +1351,22 @@ class MillikanExperimentApp:
         self.prediction_sub_frame.pack(fill=tk.BOTH, expand=True)  
 
         # Update the gauge and integer chart
-        self.update_gauge(charge)
+        self.update_gauge(charge, uncertainty)
         self.update_integer_chart(charge, integer)
 
-    def update_gauge(self, charge):
-        """Update the vertical gauge using matplotlib."""
-        max_charge = 1e-18  # Adjust maximum for better scaling
-        normalized_charge = min(charge / max_charge, 1.0)
+    def setup_gauge(self):
+        """Build the vertical gauge once; update_gauge only changes its bar and title."""
+        max_charge = self.gauge_max_charge = 1e-18  # Adjust maximum for better scaling
 
         # Clear the previous gauge
         self.gauge_ax.clear()
 
         # Plot the vertical bar
-        self.gauge_ax.bar(
+        self.gauge_bar = self.gauge_ax.bar(
+            [0],  
             [0],  
-            [normalized_charge * max_charge],  
             width=0.4, color="blue", edgecolor="black"
-        )
+        ).patches[0]
 
         # Add labels and formatting
         self.gauge_ax.set_ylim(0, max_charge)  
@@ -970,57 +1376,130 @@ class MillikanExperimentApp:
         self.gauge_ax.tick_params(axis="y", labelsize=8)
         self.gauge_ax.grid(True, axis="y", linestyle="--", alpha=0.6)
 
-        # Set a title with the charge value
-        self.gauge_ax.set_title(
-            f"q = {charge:.2e} C", fontsize=10, color="blue", pad=15
+        # Title with the charge value, filled in by update_gauge
+        self.gauge_title = self.gauge_ax.set_title(
+            "", fontsize=10, color="blue", pad=15
         )
 
+        # Error bar over the confidence interval, hidden without an uncertainty
+        self.gauge_error_bar, = self.gauge_ax.plot([0, 0], [0, 0], color="black", marker="_", markersize=14, linewidth=1.5, visible=False)
+
         # Adjust layout to ensure no clipping
         self.gauge_figure.subplots_adjust(left=0.3, right=.95, top=0.8, bottom=0.1)
-
-        # Redraw the gauge
-        self.gauge_chart_canvas.draw()
-
-    def update_integer_chart(self, charge, integer):
-        """Update the histogram for integer observations."""
+        self.gauge_blit.set_artists([self.gauge_bar, self.gauge_error_bar, self.gauge_title])
+
+    def update_gauge(self, charge, uncertainty=None):
+        """Update the vertical gauge using matplotlib, with the Monte Carlo interval as an error bar."""
+        normalized_charge = min(charge / self.gauge_max_charge, 1.0)
+        self.gauge_bar.set_height(normalized_charge * self.gauge_max_charge)
+        if uncertainty is None:
+            self.gauge_error_bar.set_visible(False)
+            self.gauge_title.set_text(f"q = {charge:.2e} C")
+        else:
+            low = min(uncertainty['charge_low'], self.gauge_max_charge)
+            high = min(uncertainty['charge_high'], self.gauge_max_charge)
+            self.gauge_error_bar.set_ydata([low, high])
+            self.gauge_error_bar.set_visible(True)
+            self.gauge_title.set_text(f"q = {charge:.2e} ± {uncertainty['charge_std']:.1e} C\n"
+                                      f"q/e {uncertainty['integer_low']:.2f} to {uncertainty['integer_high']:.2f}")
+        self.gauge_blit.dirty = True
+        self.schedule_chart_render()
+
+    def setup_integer_chart(self):
+        """Build the histogram once; update_integer_chart only moves its bars, mode line and label."""
         self.integer_ax.clear()
 
-        if integer is not None:
-            self.charge_integer_pairs.append((charge, integer))
-
-        # Convert integers to numpy array
-        integers = np.array([pair[1] for pair in self.charge_integer_pairs])
+        # Ten bars to start with, more are added when the occupied bins outgrow them
+        self.integer_bars = []
+        self.add_integer_bars(10)
 
-        # Calculate histogram bins and counts using numpy
-        bins = np.linspace(np.min(integers), np.max(integers), 11)
-        counts, edges = np.histogram(integers, bins=bins)
-
-        # Find the bin with the highest count (mode bin)
-        max_count_index = np.argmax(counts)
-        mode_bin = (edges[max_count_index] + edges[max_count_index + 1]) / 2  # Calculate bin center
-
-        # Plot histogram
-        self.integer_ax.bar(edges[:-1], counts, width=np.diff(edges), align="edge", color="blue", edgecolor="black", alpha=0.7)
-
-        # Add line for the mode bin
-        self.integer_ax.axvline(x=mode_bin, color="red", linestyle="--", linewidth=1)
+        # Line for the mode bin
+        self.integer_mode_line = self.integer_ax.axvline(x=0, color="red", linestyle="--", linewidth=1)
 
         # Set titles and labels
         self.integer_ax.set_title("Histogram of Integers", fontsize=10)
         self.integer_ax.set_xlabel("q/e = Integer", fontsize=8)
         self.integer_ax.set_ylabel("Count", fontsize=8)
         self.integer_ax.grid(True)
+        self.integer_ax.set_xlim(0, 1)
+        self.integer_ax.set_ylim(0, 1)
 
-        # Annotate the mode bin
-        self.integer_ax.annotate(
-            f"Electron Count: {round(mode_bin)}",
+        # Annotation of the mode bin
+        self.integer_annotation = self.integer_ax.annotate(
+            "",
             xy=(0.5, 1.25), xycoords='axes fraction',
             fontsize=10, color="red", ha="center"
         )
 
-        self.integer_figure.tight_layout()
         self.integer_ax.tick_params(axis='both', which='major', labelsize=8)
-        self.integer_chart_canvas.draw()
+        self.integer_blit.set_artists(self.integer_bars + [self.integer_mode_line, self.integer_annotation])
+        self.integer_limits_set = False
+
+    def add_integer_bars(self, count):
+        self.integer_bars += self.integer_ax.bar(np.zeros(count), np.zeros(count), width=0, align="edge", color="blue", edgecolor="black", alpha=0.7).patches
+
+    def update_integer_chart(self, charge, integer):
+        """Add an estimate to the histogram and show its occupied bins, mode and spread."""
+        if integer is not None:
+            self.charge_histogram.add(integer)
+        if not len(self.charge_histogram):
+            return
+
+        counts, edges = self.charge_histogram.histogram()
+        if len(counts) > len(self.integer_bars):
+            self.add_integer_bars(len(counts) - len(self.integer_bars))
+            self.integer_blit.set_artists(self.integer_bars + [self.integer_mode_line, self.integer_annotation])
+
+        for bar, left, count in zip(self.integer_bars, edges[:-1], counts):
+            bar.set_x(left)
+            bar.set_width(self.charge_histogram.bin_width)
+            bar.set_height(count)
+        # Bars past the occupied range stay empty
+        for bar in self.integer_bars[len(counts):]:
+            bar.set_width(0)
+            bar.set_height(0)
+
+        # Move the line for the mode bin
+        mode_bin = self.charge_histogram.mode()
+        self.integer_mode_line.set_xdata([mode_bin, mode_bin])
+
+        # Annotate the mode bin, with the mean and spread once there are two estimates
+        label = f"Electron Count: {round(mode_bin)}"
+        if self.charge_histogram.std is not None:
+            label += f" (mean {self.charge_histogram.mean:.2f} ± {self.charge_histogram.std:.2f})"
+        self.integer_annotation.set_text(label)
+
+        # Limits only grow, so the layout and the static background are only redone when they change
+        if self.integer_limits_set:
+            x_limits = expand_limits(self.integer_ax.get_xlim(), edges[0], edges[-1], margin=0.1)
+            y_limits = expand_limits(self.integer_ax.get_ylim(), 0, counts.max(), margin=0.5)
+        else:
+            x_limits = (edges[0] - 0.5, edges[-1] + 0.5)
+            y_limits = (0, counts.max() * 1.5)
+            self.integer_limits_set = True
+        if x_limits is not None:
+            self.integer_ax.set_xlim(*x_limits)
+        if y_limits is not None:
+            self.integer_ax.set_ylim(0, y_limits[1])
+        if x_limits is not None or y_limits is not None:
+            self.integer_figure.tight_layout()
+            self.integer_blit.request_full_draw()
+
+        self.integer_blit.dirty = True
+        self.schedule_chart_render()
+
+
+def refresh_catalog(catalog, entries):
+    """Catalog thread: queue every probed entry for poll_catalog, then None when done."""
+    try:
+        catalog.refresh(entries.put)
+    finally:
+        entries.put(None)
+
+
+def import_deferred_modules():
+    for name in DEFERRED_IMPORTS:
+        importlib.import_module(name)
 
 
 if __name__ == "__main__":
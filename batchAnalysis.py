@@ -0,0 +1,247 @@
+import argparse
+import glob
+import json
+import os
+import time
+from multiprocessing import Pool
+import cv2
+import numpy as np
+from components import AnalysisEngine, ChargeHistogram, ChargeQuantumEstimator, DropletDetector, ResultCache, TRACKER_TYPES
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov')
+DEVIATION_FIELDS = ('vu', 'vd', 'charge', 'integer')
+MIN_QUANTUM_CHARGES = 10  # Fewer charges line up on some quantum by chance alone
+
+def collect_videos(inputs):
+    """Expand files, directories and glob patterns into a sorted list of video paths."""
+    videos = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths = [os.path.join(item, f) for f in os.listdir(item)]
+        else:
+            paths = glob.glob(item)
+        videos.extend(p for p in paths if p.lower().endswith(VIDEO_EXTENSIONS))
+    return sorted(set(videos))
+
+def load_rois(path):
+    """Load a {video file name: [x, y, w, h] or [[x, y, w, h], ...]} mapping of initial ROIs.
+
+    Every entry is returned as a list of bboxes, one per droplet to track.
+    """
+    with open(path) as f:
+        rois = json.load(f)
+    return {
+        name: [tuple(bbox) for bbox in (value if isinstance(value[0], list) else [value])]
+        for name, value in rois.items()
+    }
+
+def init_worker():
+    # One video per process; keep OpenCV from oversubscribing the cores
+    cv2.setNumThreads(1)
+
+def analyze_job(job):
+    """Analyze every droplet of one video; returns a list of summaries, one per droplet.
+
+    Without bboxes, the best `auto_roi` droplets found by DropletDetector are tracked.
+    With `check_step`, a frame-skipping run is compared against full-rate tracking.
+    With `chunks` > 1 the video is tracked in that many frame ranges on `workers`
+    processes, and `check_chunks` compares the stitched result against a sequential run.
+    Both checks time the two runs, so they bypass the result cache.
+    """
+    (video_path, bboxes, tracker_type, cache_dir, auto_roi, max_step, max_displacement, check_step,
+     chunks, overlap, workers, check_chunks) = job
+    timed = check_chunks if chunks > 1 else check_step and max_step > 1
+    cache = ResultCache(cache_dir) if cache_dir and not timed else None
+    try:
+        if bboxes is None:
+            bboxes = [detection['bbox'] for detection in DropletDetector().detect_video(video_path, max_droplets=auto_roi)]
+            if not bboxes:
+                raise IOError("No droplets detected")
+        engine = AnalysisEngine(tracker_type=tracker_type, cache=cache, max_step=max_step, max_displacement=max_displacement)
+        if chunks > 1:
+            results = engine.analyze_chunked(video_path, bboxes, chunks, overlap=overlap, workers=workers)
+            if check_chunks:
+                references = AnalysisEngine(tracker_type=tracker_type).analyze_droplets(video_path, bboxes)
+                for result, reference in zip(results, references):
+                    result['chunk_deviation'] = chunk_deviation(result, reference)
+            return [summarize(result) for result in results]
+        results = engine.analyze_droplets(video_path, bboxes)
+        if check_step and max_step > 1:
+            references = AnalysisEngine(tracker_type=tracker_type).analyze_droplets(video_path, bboxes)
+            for result, reference in zip(results, references):
+                result['step_deviation'] = step_deviation(result, reference)
+    except (IOError, ValueError, cv2.error) as e:
+        return [{'video': os.path.basename(video_path), 'video_path': video_path, 'droplet': 0, 'error': str(e), 'frames': 0}]
+    return [summarize(result) for result in results]
+
+def step_deviation(result, reference):
+    """Relative deviation of a frame-skipping result from full-rate tracking, and the speedup."""
+    deviation = {}
+    for name in DEVIATION_FIELDS:
+        if result.get(name) is not None and reference.get(name):
+            deviation[name] = result[name] / reference[name] - 1
+    deviation['decoded_fraction'] = result['decoded_frames'] / reference['decoded_frames']
+    if result['elapsed'] and reference['elapsed']:
+        deviation['speedup'] = reference['elapsed'] / result['elapsed']
+    return deviation
+
+def chunk_deviation(result, reference):
+    """step_deviation of a stitched chunked result, plus how far its y centers are from the sequential ones in pixels."""
+    deviation = step_deviation(result, reference)
+    common, rows, reference_rows = np.intersect1d(result['bbox_frames'], reference['bbox_frames'], return_indices=True)
+    if len(common):
+        a, b = result['bboxes'][rows], reference['bboxes'][reference_rows]
+        errors = np.abs((a[:, 1] + a[:, 3] / 2) - (b[:, 1] + b[:, 3] / 2))
+        deviation['y_error_mean'] = float(errors.mean())
+        deviation['y_error_max'] = float(errors.max())
+    return deviation
+
+def summarize(result):
+    """Drop the per-frame data so the result can be written as JSON."""
+    summary = {key: value for key, value in result.items() if key not in ('y_centers', 'bbox_frames', 'bboxes')}
+    summary['peaks'] = [int(p) for p in result['peaks']]
+    summary['troughs'] = [int(t) for t in result['troughs']]
+    summary['bbox'] = [int(v) for v in result['bbox']]
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch Millikan droplet analysis without the GUI.")
+    parser.add_argument('inputs', nargs='+', help="Video files, directories or glob patterns")
+    parser.add_argument('--roi', nargs=4, type=int, metavar=('X', 'Y', 'W', 'H'), help="Initial ROI used for every video")
+    parser.add_argument('--rois', help="JSON file mapping video file names to initial ROIs")
+    parser.add_argument('--auto-roi', nargs='?', const=1, type=int, metavar='N', help="Detect and track the best N droplets (default 1) in videos without a given ROI")
+    parser.add_argument('--tracker', default='CSRT', choices=list(TRACKER_TYPES), help="Tracker backend")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--output', default=os.path.join('output', 'batch_results.json'), help="Where to write the JSON results")
+    parser.add_argument('--cache', help="Result cache directory, e.g. output/cache; videos analyzed before with the same ROIs and settings are not tracked again (not used with --check-step or --check-chunks, which time fresh runs)")
+    parser.add_argument('--max-step', type=int, default=1, metavar='K', help="Fast mode: track at most every K-th frame and interpolate the rest")
+    parser.add_argument('--max-displacement', type=float, default=8.0, metavar='PX', help="Fast mode: pixels a droplet may move between tracked frames")
+    parser.add_argument('--check-step', action='store_true', help="Also track every frame and report how far the fast mode's vu, vd and charge deviate")
+    parser.add_argument('--chunks', type=int, default=1, metavar='N', help="Track each video in N overlapping frame ranges on --workers processes and stitch the trajectories; videos run one after another")
+    parser.add_argument('--overlap', type=int, default=30, metavar='FRAMES', help="Frames shared by neighbouring chunks, compared to check each boundary")
+    parser.add_argument('--check-chunks', action='store_true', help="Also track every video sequentially and report the chunked speedup and stitching error")
+    parser.add_argument('--histogram', metavar='PATH', help="Add the q/e values to the histogram saved in this JSON file (created if missing), to aggregate over many batches")
+    parser.add_argument('--bin-width', type=float, default=0.25, help="q/e bin width of the histogram, unless --histogram names an existing one")
+    args = parser.parse_args()
+
+    rois = load_rois(args.rois) if args.rois else {}
+    jobs = []
+    for video_path in collect_videos(args.inputs):
+        bboxes = rois.get(os.path.basename(video_path), [args.roi] if args.roi else None)
+        if bboxes is None and not args.auto_roi:
+            print(f"Skipping {video_path}: no ROI given")
+            continue
+        jobs.append((video_path, bboxes, args.tracker, args.cache, args.auto_roi, args.max_step, args.max_displacement, args.check_step,
+                     args.chunks, args.overlap, args.workers, args.check_chunks))
+
+    if not jobs:
+        parser.error("No videos to analyze.")
+
+    start_time = time.perf_counter()
+    results = []
+    total_frames = 0
+    cache_hits = 0
+    # Chunked videos bring their own worker processes, and pool workers cannot start any
+    pool = Pool(processes=max(1, min(args.workers, len(jobs))), initializer=init_worker) if args.chunks <= 1 else None
+    try:
+        for video_results in (pool.imap_unordered(analyze_job, jobs) if pool else map(analyze_job, jobs)):
+            results.extend(video_results)
+            if video_results[0].get('cached'):
+                cache_hits += 1
+            else:
+                total_frames += video_results[0]['frames']  # Decoded once for all droplets
+            for result in video_results:
+                if result.get('charge') is not None:
+                    line = f"{result['video']} #{result['droplet']}: q = {result['charge']:.3e} C, q/e = {result['integer']:.2f}"
+                    if 'step_deviation' in result:
+                        deviation = result['step_deviation']
+                        line += ", vs full rate: " + ", ".join(f"{name} {deviation[name]:+.2%}" for name in DEVIATION_FIELDS if name in deviation)
+                    if 'chunk_deviation' in result:
+                        deviation = result['chunk_deviation']
+                        line += ", vs sequential: " + ", ".join(f"{name} {deviation[name]:+.2%}" for name in DEVIATION_FIELDS if name in deviation)
+                    print(line)
+                else:
+                    print(f"{result['video']} #{result['droplet']}: {result['error']}")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - start_time
+
+    print(f"\nProcessed {len(jobs)} videos ({total_frames} frames) in {elapsed:.2f} s")
+    print(f"Throughput: {len(jobs) / elapsed:.2f} videos/s, {total_frames / elapsed:.1f} frames/s")
+    if args.cache:
+        print(f"Result cache: {cache_hits} hits, {len(jobs) - cache_hits} misses")
+    deviations = [result['step_deviation'] for result in results if 'step_deviation' in result]
+    if deviations:
+        print(f"\nFast mode (max step {args.max_step}) against full-rate tracking over {len(deviations)} droplets:")
+        for name in DEVIATION_FIELDS:
+            values = np.abs([deviation[name] for deviation in deviations if name in deviation])
+            if len(values):
+                print(f"{name:>8}: mean |deviation| {values.mean():.2%}, max {values.max():.2%}")
+        print(f"Decoded {np.mean([d['decoded_fraction'] for d in deviations]):.0%} of the frames, "
+              f"{np.mean([d['speedup'] for d in deviations if 'speedup' in d] or [np.nan]):.1f}x faster")
+
+    deviations = [result['chunk_deviation'] for result in results if 'chunk_deviation' in result]
+    if deviations:
+        print(f"\nChunked tracking ({args.chunks} chunks, {args.overlap} frames overlap) against sequential tracking over {len(deviations)} droplets:")
+        for name in DEVIATION_FIELDS:
+            values = np.abs([deviation[name] for deviation in deviations if name in deviation])
+            if len(values):
+                print(f"{name:>8}: mean |deviation| {values.mean():.2%}, max {values.max():.2%}")
+        y_errors = [d for d in deviations if 'y_error_mean' in d]
+        if y_errors:
+            print(f"y center: mean error {np.mean([d['y_error_mean'] for d in y_errors]):.2f} px, "
+                  f"max {max(d['y_error_max'] for d in y_errors):.2f} px")
+        print(f"{np.mean([d['speedup'] for d in deviations if 'speedup' in d] or [np.nan]):.1f}x faster")
+
+    integers = [result['integer'] for result in results if result.get('integer') is not None]
+    batch_histogram = ChargeHistogram(args.bin_width)
+    batch_histogram.extend(integers)
+    histogram = batch_histogram
+    if args.histogram:
+        if os.path.exists(args.histogram):
+            histogram = ChargeHistogram.load(args.histogram)
+            if histogram.bin_width == batch_histogram.bin_width:
+                histogram.merge(batch_histogram)
+            else:
+                # The saved bins win, so the aggregate keeps one set of bins
+                histogram.extend(integers)
+        os.makedirs(os.path.dirname(args.histogram) or '.', exist_ok=True)
+        histogram.save(args.histogram)
+    if len(histogram):
+        spread = f", std {histogram.std:.2f}" if histogram.std is not None else ""
+        print(f"q/e over {len(histogram)} droplets: mode {histogram.mode():g}, mean {histogram.mean:.2f}{spread}")
+
+    # e from the charges themselves, with no elementary charge assumed
+    quantum = None
+    charges = [result['charge'] for result in results if result.get('charge') is not None]
+    if len(charges) < MIN_QUANTUM_CHARGES:
+        if len(charges) > 1:
+            print(f"Charge quantum: insufficient data ({len(charges)} droplets, need {MIN_QUANTUM_CHARGES})")
+    else:
+        try:
+            quantum = ChargeQuantumEstimator().estimate(charges, seed=0)
+            if quantum['significant']:
+                print(f"Charge quantum from {quantum['inliers']} droplets ({quantum['outliers']} rejected): "
+                      f"e = {quantum['e']:.4e} C, {quantum['confidence']:.0%} CI [{quantum['e_low']:.4e}, {quantum['e_high']:.4e}], coherence {quantum['coherence']:.2f}")
+            else:
+                print(f"Charge quantum: insufficient data (coherence {quantum['coherence']:.2f} of {len(charges)} droplets "
+                      f"is within chance, {quantum['chance_coherence']:.2f})")
+        except ValueError as e:
+            print(f"Charge quantum: {e}")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({
+            'elapsed': elapsed,
+            'videos_per_second': len(jobs) / elapsed,
+            'frames_per_second': total_frames / elapsed,
+            'histogram': batch_histogram.to_dict(),
+            'quantum': quantum,
+            'results': sorted(results, key=lambda r: (r['video_path'], r['droplet'])),
+        }, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
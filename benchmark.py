@@ -0,0 +1,199 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import cv2
+import numpy as np
+from util import video_fps
+from components import ChargeCalculator, MultiDropletTracker, TRACKER_TYPES
+from batchAnalysis import collect_videos, load_rois
+
+# Pipeline stages in the order update_video_frame and process_batch_data run them
+STAGES = ('decode', 'resize', 'track', 'batch', 'peaks', 'velocities', 'charge', 'frame')
+PERCENTILES = (50, 90, 95, 99)
+
+def benchmark_video(video_path, bboxes, tracker_type='CSRT', max_frames=None, size=(512, 512), batch_size=50):
+    """Run the app's tracking pipeline on one video and time every stage separately.
+
+    Returns per-stage lists of durations in seconds and a summary of the run. 'frame'
+    is the end-to-end time of one frame, batch work included on the frames that do it.
+    """
+    timings = {stage: [] for stage in STAGES}
+    charge_calculator = ChargeCalculator()
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise IOError(f"Could not open video {video_path}")
+    multi_tracker = MultiDropletTracker(tracker_type, fps=video_fps(video), total_frames=int(video.get(cv2.CAP_PROP_FRAME_COUNT)))
+    start_time = time.perf_counter()
+    try:
+        ret, frame = video.read()
+        if not ret:
+            raise IOError(f"Could not read the first frame of the video {video_path}")
+        frame = cv2.resize(frame, size)
+        for bbox in bboxes:
+            multi_tracker.add(frame, tuple(int(v) for v in bbox), 0)
+
+        frame_index = 0
+        charges = []
+        while max_frames is None or frame_index < max_frames:
+            t0 = time.perf_counter()
+            ret, frame = video.read()
+            t1 = time.perf_counter()
+            if not ret:
+                break
+            frame = cv2.resize(frame, size)
+            t2 = time.perf_counter()
+            frame_index += 1
+            multi_tracker.update(frame, frame_index)
+            t3 = time.perf_counter()
+            timings['decode'].append(t1 - t0)
+            timings['resize'].append(t2 - t1)
+            timings['track'].append(t3 - t2)
+
+            for droplet in multi_tracker:
+                if droplet.trajectory.pending() >= batch_size:
+                    charges.append(time_batch(droplet, charge_calculator, timings))
+            timings['frame'].append(time.perf_counter() - t0)
+    finally:
+        video.release()
+        multi_tracker.shutdown()
+
+    elapsed = time.perf_counter() - start_time
+    charges = [charge for charge in charges if charge is not None]
+    return timings, {
+        'frames': frame_index + 1,
+        'elapsed': elapsed,
+        'fps': (frame_index + 1) / elapsed,
+        'charge': charges[-1][0] if charges else None,
+        'integer': charges[-1][1] if charges else None,
+    }
+
+def time_batch(droplet, charge_calculator, timings):
+    """process_batch_data and update_chart for one droplet, one stage at a time."""
+    t0 = time.perf_counter()
+    droplet.trajectory.flush()
+    t1 = time.perf_counter()
+    droplet.extrema_detector.update()
+    t2 = time.perf_counter()
+    vu, vd = droplet.extrema_detector.velocities()
+    t3 = time.perf_counter()
+    try:
+        result = charge_calculator.find_charge_and_integer(vu, vd)
+    except ValueError:
+        result = None
+    t4 = time.perf_counter()
+    timings['batch'].append(t1 - t0)
+    timings['peaks'].append(t2 - t1)
+    timings['velocities'].append(t3 - t2)
+    timings['charge'].append(t4 - t3)
+    return result
+
+def stage_stats(samples):
+    samples = np.asarray(samples) * 1e3
+    if len(samples) == 0:
+        return {'count': 0}
+    stats = {'count': len(samples), 'mean_ms': float(samples.mean())}
+    for percentile, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+        stats[f'p{percentile}_ms'] = float(value)
+    stats['max_ms'] = float(samples.max())
+    stats['total_ms'] = float(samples.sum())
+    return stats
+
+def compare(results, baseline, metric, threshold):
+    """Stages whose `metric` got slower than the baseline by more than `threshold` (a fraction)."""
+    regressions = []
+    for stage, stats in results['stages'].items():
+        reference = baseline.get('stages', {}).get(stage, {}).get(metric)
+        current = stats.get(metric)
+        if reference is None or current is None or reference <= 0:
+            continue
+        change = current / reference - 1
+        print(f"{stage:>10} {reference:10.4f} {current:10.4f} {change:+8.1%}{'  REGRESSION' if change > threshold else ''}")
+        if change > threshold:
+            regressions.append({'stage': stage, 'baseline': reference, 'current': current, 'change': change})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage-by-stage timing of the tracking pipeline, compared against a baseline.")
+    parser.add_argument('inputs', nargs='*', default=[os.path.join('Videos', 'Videos')], help="Video files, directories or glob patterns")
+    parser.add_argument('--rois', default=os.path.join('benchmarks', 'rois.json'), help="JSON file mapping video file names to initial ROIs")
+    parser.add_argument('--tracker', default='CSRT', choices=list(TRACKER_TYPES), help="Tracker backend")
+    parser.add_argument('--max-frames', type=int, help="Only track the first N frames of each video")
+    parser.add_argument('--output', default=os.path.join('output', 'benchmark.json'), help="Where to write the JSON results")
+    parser.add_argument('--baseline', default=os.path.join('benchmarks', 'baseline.json'), help="Results to compare against")
+    parser.add_argument('--metric', default='p50_ms', choices=['mean_ms'] + [f'p{p}_ms' for p in PERCENTILES] + ['max_ms'], help="Statistic compared with the baseline")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown before a stage counts as a regression, as a fraction")
+    parser.add_argument('--update-baseline', action='store_true', help="Write these results as the new baseline")
+    args = parser.parse_args()
+
+    rois = load_rois(args.rois)
+    cv2.setNumThreads(1)  # Comparable numbers across machines with different core counts
+
+    timings = {stage: [] for stage in STAGES}
+    videos = {}
+    start_time = time.perf_counter()
+    for video_path in collect_videos(args.inputs):
+        name = os.path.basename(video_path)
+        if name not in rois:
+            print(f"Skipping {name}: no ROI in {args.rois}")
+            continue
+        video_timings, summary = benchmark_video(video_path, rois[name], args.tracker, args.max_frames)
+        for stage in STAGES:
+            timings[stage].extend(video_timings[stage])
+        summary['stages'] = {stage: stage_stats(video_timings[stage]) for stage in STAGES}
+        videos[name] = summary
+        print(f"{name:>8}: {summary['frames']} frames in {summary['elapsed']:.2f} s ({summary['fps']:.1f} fps), "
+              f"frame p50 {summary['stages']['frame'].get('p50_ms', float('nan')):.2f} ms")
+    if not videos:
+        parser.error("No videos with ROIs to benchmark.")
+    elapsed = time.perf_counter() - start_time
+    frames = sum(video['frames'] for video in videos.values())
+
+    results = {
+        'config': {
+            'tracker': args.tracker,
+            'max_frames': args.max_frames,
+            'rois': args.rois,
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+        },
+        'end_to_end': {'videos': len(videos), 'frames': frames, 'elapsed': elapsed, 'fps': frames / elapsed},
+        'stages': {stage: stage_stats(timings[stage]) for stage in STAGES},
+        'videos': videos,
+    }
+
+    print(f"\n{'Stage':>10} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage, s in results['stages'].items():
+        if s['count']:
+            print(f"{stage:>10} {s['count']:7d} {s['mean_ms']:9.4f} {s['p50_ms']:9.4f} {s['p95_ms']:9.4f} {s['p99_ms']:9.4f} {s['max_ms']:9.4f}")
+    print(f"End to end: {frames} frames in {elapsed:.2f} s ({frames / elapsed:.1f} fps)")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} ({args.metric}, threshold {args.threshold:.0%}):")
+        print(f"{'Stage':>10} {'baseline':>10} {'current':>10} {'change':>8}")
+        regressions = compare(results, baseline, args.metric, args.threshold)
+        results['comparison'] = {'baseline': args.baseline, 'metric': args.metric, 'threshold': args.threshold, 'regressions': regressions}
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} stage(s) regressed: {', '.join(r['stage'] for r in regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+import os
+import time
+import numpy as np
+from util import extract_video_properties, video_fps
+from .ChargeCalculator import ChargeCalculator
+from .DropletDetector import DropletDetector
+from .MultiDropletTracker import DropletTrack, MultiDropletTracker
+from .Trackers import create_tracker
+
+SKIP = 'skip'  # Seed of a droplet a chunk job leaves out
+
+def track_chunk(job):
+    """Track droplets over the frames [start, stop) of a video, in a worker process.
+
+    `seeds` holds the box of every droplet on frame `start`, None to seed it from the
+    best detection on that frame in the column of its `hint` box (droplets in these
+    videos mostly move up and down), or SKIP to leave it out. Returns (frames, bboxes)
+    per droplet, starting with the seed, or None for a droplet without a seed, and the
+    number of frames decoded, the detection pass included.
+    """
+    import cv2
+
+    video_path, start, stop, seeds, hints, tracker_type, size = job
+    cv2.setNumThreads(1)  # One chunk per core
+    decoded = 0
+    if any(seed is None for seed in seeds):
+        detector = DropletDetector()
+        detections = [d['bbox'] for d in detector.detect_video(video_path, start_frame=start, size=size)]
+        seeds = [seed if seed is not None else best_in_column(detections, hint) for seed, hint in zip(seeds, hints)]
+        decoded += min(detector.frames, stop - start)
+    seeds = [None if isinstance(seed, str) and seed == SKIP else seed for seed in seeds]
+
+    video = cv2.VideoCapture(video_path)
+    try:
+        video.set(cv2.CAP_PROP_POS_FRAMES, start)
+        ret, frame = video.read()
+        if not ret:
+            return [None] * len(seeds), decoded
+        decoded += 1
+        frame = cv2.resize(frame, size)
+        trackers = []
+        for seed in seeds:
+            tracker = None
+            if seed is not None:
+                tracker = create_tracker(tracker_type)
+                tracker.init(frame, tuple(int(v) for v in seed))
+            trackers.append(tracker)
+        tracks = [([start], [tuple(seed)]) if seed is not None else None for seed in seeds]
+        for frame_index in range(start + 1, stop):
+            ret, frame = video.read()
+            if not ret:
+                break
+            decoded += 1
+            frame = cv2.resize(frame, size)
+            for tracker, track in zip(trackers, tracks):
+                if tracker is None:
+                    continue
+                ok, bbox = tracker.update(frame)
+                if ok:
+                    track[0].append(frame_index)
+                    track[1].append(bbox)
+    finally:
+        video.release()
+    return [None if track is None else (np.array(track[0]), np.array(track[1], dtype=float)) for track in tracks], decoded
+
+def best_in_column(detections, hint):
+    """Box of the hint's size on the first of the ranked detections within half a box width of it in x, or None."""
+    x, y, w, h = hint
+    for dx, dy, dw, dh in detections:
+        if abs(dx + dw / 2 - (x + w / 2)) <= w / 2:
+            return (int(round(dx + dw / 2 - w / 2)), int(round(dy + dh / 2 - h / 2)), w, h)
+    return None
+
+def box_at(track, frame_index):
+    """Tracked box on `frame_index`, or the last one before it."""
+    frames, bboxes = track
+    index = np.searchsorted(frames, frame_index, side='right') - 1
+    return tuple(int(round(v)) for v in bboxes[max(index, 0)])
+
+def overlap_error(previous, track, start, stop):
+    """Median distance in pixels between the box centers of two tracks on their common frames in [start, stop)."""
+    if previous is None or track is None:
+        return np.inf
+    common, previous_rows, rows = np.intersect1d(previous[0], track[0], return_indices=True)
+    keep = (common >= start) & (common < stop)
+    if keep.sum() < 2:
+        return np.inf
+    a, b = previous[1][previous_rows[keep]], track[1][rows[keep]]
+    centers = (a[:, :2] + a[:, 2:] / 2) - (b[:, :2] + b[:, 2:] / 2)
+    return float(np.median(np.hypot(centers[:, 0], centers[:, 1])))
+
+class AnalysisEngine:
+    """Headless version of the annotation tool's tracking and charge pipeline.
+
+    With max_step > 1 it runs in a fast mode that only tracks every k-th frame and
+    grab()s the frames in between without decoding them. k adapts to the droplets'
+    speed so that they move about max_displacement pixels per step, drops to 1 right
+    after a droplet turns around, and the skipped frames are filled in by linear
+    interpolation before they reach the detector.
+    """
+
+    def __init__(self, tracker_type='CSRT', display_width=512, display_height=512, batch_size=50, distance=100, prominence=100, cache=None,
+                 max_step=1, max_displacement=8.0):
+        self.tracker_type = tracker_type
+        self.display_width = display_width
+        self.display_height = display_height
+        self.batch_size = batch_size
+        self.distance = distance  # find_peaks settings used by update_chart
+        self.prominence = prominence
+        self.charge_calculator = ChargeCalculator()
+        self.cache = cache  # Optional ResultCache
+        self.max_step = max_step
+        self.max_displacement = max_displacement  # Pixels a droplet may move between tracked frames
+
+    def cache_params(self):
+        """Settings besides the ROIs and tracker types that change the results."""
+        params = {
+            'display_size': [self.display_width, self.display_height],
+            'batch_size': self.batch_size,
+            'distance': self.distance,
+            'prominence': self.prominence,
+            'velocities': 'segment_lstsq',
+        }
+        if self.max_step > 1:
+            params.update({'max_step': self.max_step, 'max_displacement': self.max_displacement})
+        return params
+
+    def cache_key(self, video_path, droplets):
+        """Result cache key for `droplets` [(start_frame, bbox, tracker_type)] in a video."""
+        return self.cache.key(video_path, droplets, self.cache_params())
+
+    def analyze(self, video_path, bbox):
+        """Track a droplet from the initial ROI to the end of the video and compute its charge.
+
+        The bbox is (x, y, w, h) in display coordinates, as drawn on the 512x512 canvas.
+        """
+        return self.analyze_droplets(video_path, [bbox])[0]
+
+    def analyze_droplets(self, video_path, bboxes):
+        """Track several droplets in one decode pass and return one result per droplet."""
+        import cv2
+
+        start_time = time.perf_counter()
+        video = cv2.VideoCapture(video_path)
+        if not video.isOpened():
+            raise IOError(f"Could not open video {video_path}")
+
+        bboxes = [tuple(int(v) for v in bbox) for bbox in bboxes]
+        key = None
+        if self.cache is not None:
+            key = self.cache_key(video_path, [(0, bbox, self.tracker_type) for bbox in bboxes])
+            results = self.cache.get(key)
+            if results is not None:
+                video.release()
+                for result in results:
+                    result.update({'video_path': video_path, 'cached': True})
+                return results
+
+        fps = video_fps(video)
+        total_frames, frame_width, frame_height = extract_video_properties(video)
+        multi_tracker = MultiDropletTracker(self.tracker_type, distance=self.distance, prominence=self.prominence,
+                                            fps=fps, total_frames=total_frames)
+        try:
+            ret, frame = video.read()
+            if not ret:
+                raise IOError(f"Could not read the first frame of the video {video_path}")
+
+            frame = cv2.resize(frame, (self.display_width, self.display_height))
+            current_frame = 0
+            for bbox in bboxes:
+                multi_tracker.add(frame, bbox, current_frame)
+
+            step = 1
+            tracked_frames = 0
+            motion = {}  # droplet -> (frame index, y-center, velocity) at its last tracked frame
+            while True:
+                # Skipped frames are only demuxed, not decoded
+                skipped = 0
+                while skipped < step - 1 and video.grab():
+                    skipped += 1
+                ret, frame = video.read()
+                if not ret:
+                    break
+                frame = cv2.resize(frame, (self.display_width, self.display_height))
+                current_frame += skipped + 1
+                tracked_frames += 1
+                multi_tracker.update(frame, current_frame, interpolate=self.max_step > 1)
+                if self.max_step > 1:
+                    step = self.next_step(multi_tracker, current_frame, motion)
+
+                # Same batching as process_batch_data, so the charge history matches the app
+                for droplet in multi_tracker:
+                    if droplet.trajectory.pending() >= self.batch_size:
+                        self.process_batch(droplet, current_frame)
+
+            # The trailing partial batch counts too, as when the app reaches the end of the video
+            for droplet in multi_tracker:
+                if droplet.trajectory.pending():
+                    self.process_batch(droplet, current_frame)
+        finally:
+            video.release()
+            multi_tracker.shutdown()
+
+        results = self.build_results(video_path, multi_tracker.droplets, total_frames, frame_width, frame_height,
+                                     current_frame + 1, time.perf_counter() - start_time, fps)
+        for result in results:
+            result['decoded_frames'] = tracked_frames + 1  # The frames the trackers ran on, the first one included
+        if key is not None:
+            self.cache.put(key, results)
+        return results
+
+    def analyze_chunked(self, video_path, bboxes, chunks, overlap=30, workers=None, tolerance=3.0):
+        """Track one video in `chunks` frame ranges on worker processes and stitch the trajectories.
+
+        Chunk i covers its frames plus `overlap` frames of the next chunk. Chunk 0 starts
+        from the ROIs, the others from the droplet detections on their first frame. Where
+        the two chunks at a boundary track a droplet more than `tolerance` pixels apart over
+        the overlap (or the detection missed it), the later chunk is tracked again from the
+        earlier one's box; those re-tracks run in parallel once their predecessor is settled.
+        The stitched boxes go through the same batches as analyze_droplets. The result cache
+        is not used.
+        """
+        import cv2
+        from multiprocessing import Pool
+
+        start_time = time.perf_counter()
+        video = cv2.VideoCapture(video_path)
+        if not video.isOpened():
+            raise IOError(f"Could not open video {video_path}")
+        fps = video_fps(video)
+        total_frames, frame_width, frame_height = extract_video_properties(video)
+        video.release()
+
+        bboxes = [tuple(int(v) for v in bbox) for bbox in bboxes]
+        chunks = max(1, min(chunks, total_frames // max(2 * overlap, 1)))
+        starts = np.linspace(0, total_frames, chunks + 1).astype(int)
+        size = (self.display_width, self.display_height)
+
+        def job(chunk, seeds):
+            stop = min(starts[chunk + 1] + overlap, total_frames)
+            return (video_path, int(starts[chunk]), int(stop), seeds, bboxes, self.tracker_type, size)
+
+        count = len(bboxes)
+        settled = [[chunk == 0] * count for chunk in range(chunks)]
+        boundary_errors = np.full((chunks - 1, count), np.nan)
+        retracked = 0
+        with Pool(processes=min(workers or os.cpu_count(), chunks)) as pool:
+            outcomes = pool.map(track_chunk, [job(chunk, list(bboxes) if chunk == 0 else [None] * count) for chunk in range(chunks)])
+            tracks = [chunk_tracks for chunk_tracks, _ in outcomes]
+            decoded = sum(frames for _, frames in outcomes)
+            while not all(all(row) for row in settled):
+                # Boundaries settle in order; a failed one is re-tracked from its settled predecessor
+                retrack = {}
+                for chunk in range(1, chunks):
+                    for droplet in range(count):
+                        if settled[chunk][droplet] or not settled[chunk - 1][droplet]:
+                            continue
+                        error = overlap_error(tracks[chunk - 1][droplet], tracks[chunk][droplet], starts[chunk], starts[chunk] + overlap)
+                        if error <= tolerance:
+                            settled[chunk][droplet] = True
+                            boundary_errors[chunk - 1, droplet] = error
+                        else:
+                            retrack.setdefault(chunk, []).append(droplet)
+                jobs = []
+                for chunk, droplets in retrack.items():
+                    seeds = [SKIP] * count  # Only the droplets that failed the boundary are tracked again
+                    for droplet in droplets:
+                        previous = tracks[chunk - 1][droplet]
+                        seeds[droplet] = box_at(previous, starts[chunk]) if previous is not None else bboxes[droplet]
+                    jobs.append(job(chunk, seeds))
+                for (chunk, droplets), (chunk_tracks, frames) in zip(retrack.items(), pool.map(track_chunk, jobs)):
+                    decoded += frames
+                    for droplet in droplets:
+                        tracks[chunk][droplet] = chunk_tracks[droplet]
+                        settled[chunk][droplet] = True
+                        boundary_errors[chunk - 1, droplet] = overlap_error(tracks[chunk - 1][droplet], chunk_tracks[droplet], starts[chunk], starts[chunk] + overlap)
+                        retracked += 1
+
+        droplets = []
+        for index, bbox in enumerate(bboxes):
+            droplet = DropletTrack(None, bbox, 0, self.distance, self.prominence, self.tracker_type, fps, total_frames)
+            frames, boxes = [], []
+            for chunk in range(chunks):
+                track = tracks[chunk][index]
+                if track is None:
+                    continue
+                own = (track[0] >= max(starts[chunk], 1)) & (track[0] < starts[chunk + 1])
+                frames.append(track[0][own])
+                boxes.append(track[1][own])
+            if not frames:
+                # No chunk could track the droplet, the result reports it like an empty run
+                frames, boxes = [np.array([], dtype=int)], [np.empty((0, 4))]
+            frames, boxes = np.concatenate(frames), np.concatenate(boxes)
+            # Same batches as a sequential run: one every batch_size tracked frames
+            for first in range(0, len(frames), self.batch_size):
+                batch = slice(first, first + self.batch_size)
+                droplet.trajectory.extend(frames[batch], boxes[batch])
+                self.process_batch(droplet, int(frames[batch][-1]))
+            if len(boxes):
+                droplet.bbox = tuple(boxes[-1])
+            droplets.append(droplet)
+
+        results = self.build_results(video_path, droplets, total_frames, frame_width, frame_height,
+                                     total_frames, time.perf_counter() - start_time, fps)
+        for index, result in enumerate(results):
+            result.update({
+                'chunks': chunks,
+                'overlap': overlap,
+                'boundary_errors': [float(e) if np.isfinite(e) else None for e in boundary_errors[:, index]],  # None where re-tracking failed too
+                'retracked_chunks': retracked,
+                'decoded_frames': int(decoded),  # Overlaps, detections and re-tracks included
+            })
+        return results
+
+    def next_step(self, droplets, frame_index, motion):
+        """Frames to advance before tracking again, from the droplets' speed since their last tracked frame."""
+        step = self.max_step
+        for droplet in droplets:
+            y = droplet.bbox[1] + droplet.bbox[3] / 2
+            velocity = None
+            if droplet in motion:
+                last_frame, last_y, last_velocity = motion[droplet]
+                if frame_index > last_frame:
+                    velocity = (y - last_y) / (frame_index - last_frame)
+                    if last_velocity is not None and velocity * last_velocity < 0:
+                        step = 1  # Turned around, sample the reversal densely
+                    elif velocity:
+                        step = min(step, max(1, int(self.max_displacement / abs(velocity))))
+            motion[droplet] = (frame_index, y, velocity)
+        return step
+
+    def process_batch(self, droplet, frame_index):
+        """Hand a droplet's pending y-centers on to its detector and record the new charge estimate."""
+        droplet.trajectory.flush()
+        estimate = self.estimate_charge(droplet.extrema_detector)
+        if estimate['charge'] is not None:
+            droplet.charge_history.append((frame_index, estimate['charge'], estimate['integer']))
+
+    def build_results(self, video_path, droplets, total_frames, frame_width, frame_height, frames, elapsed, fps=30.0):
+        """One result dict per tracked droplet, in the format stored by the result cache."""
+        results = []
+        for index, droplet in enumerate(droplets):
+            detector = droplet.extrema_detector
+            result = self.estimate_charge(detector)
+            result.update({
+                'video': os.path.basename(video_path),
+                'video_path': video_path,
+                'droplet': index,
+                'bbox': tuple(droplet.initial_bbox),
+                'start_frame': droplet.start_frame,
+                'tracker': droplet.tracker_type,
+                'total_frames': total_frames,
+                'frame_width': frame_width,
+                'frame_height': frame_height,
+                'fps': fps,
+                'frames': frames,
+                'tracked_frames': len(detector),
+                'y_centers': detector.y.copy(),
+                'bbox_frames': np.append(droplet.start_frame, droplet.trajectory.frames()),
+                'bboxes': np.vstack([droplet.initial_bbox, droplet.trajectory.bboxes()]),
+                'charge_history': droplet.charge_history,
+                'elapsed': elapsed,
+                'cached': False,
+            })
+            results.append(result)
+        return results
+
+    def estimate_charge(self, detector):
+        """Run update_chart's peak/trough detection, the segment velocity fits and the charge calculation."""
+        result = {
+            'peaks': np.array([], dtype=int),
+            'troughs': np.array([], dtype=int),
+            'vu': None,
+            'vd': None,
+            'charge': None,
+            'integer': None,
+            'error': None,
+        }
+        peaks, troughs = detector.update()
+        if len(detector) == 0:
+            result['error'] = "No tracked frames"
+            return result
+
+        result['peaks'] = peaks
+        result['troughs'] = troughs
+        vu, vd = detector.velocities()
+        result['vu'] = float(vu)
+        result['vd'] = float(vd)
+        try:
+            charge, integer = self.charge_calculator.find_charge_and_integer(vu, vd)
+            result['charge'] = float(charge)
+            result['integer'] = float(integer)
+        except ValueError as e:
+            result['error'] = str(e).strip()
+        return result
@@ -0,0 +1,46 @@
+class BlitManager:
+    """Redraws only the animated artists of a figure on top of a cached background.
+
+    The artists handed to set_artists are marked animated, so a full canvas draw
+    renders everything else; the result is kept as the background from the draw
+    event and update() then restores it and draws the animated artists over it.
+    Call request_full_draw() when anything static changes (limits, legend, layout).
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.artists = []
+        self.background = None
+        self.dirty = False
+        self.full_draw = True
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def set_artists(self, artists):
+        for artist in artists:
+            artist.set_animated(True)
+        self.artists = list(artists)
+        self.request_full_draw()
+
+    def request_full_draw(self):
+        self.full_draw = True
+        self.dirty = True
+
+    def on_draw(self, event):
+        # Also runs after resizes, which invalidate the background
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+
+    def update(self):
+        """Show the current state of the artists, with a full draw only when one was requested."""
+        if self.full_draw or self.background is None:
+            self.full_draw = False
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self._draw_artists()
+            self.canvas.blit(self.canvas.figure.bbox)
+        self.dirty = False
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.canvas.figure.draw_artist(artist)
@@ -11,36 +11,141 @@ class ChargeCalculator:
         self.roomtempc = 20  # Room temperature in Celsius
         self.density_oil = 0.861e3  # Density of oil in kg/m^3
         self.a_gravity = 9.81  # Acceleration due to gravity in m/s^2
+        # Uncertainties of the apparatus for charge_uncertainty: (distribution, width) with
+        # the standard deviation of a normal or the half-width of a uniform distribution
+        self.uncertainties = {
+            'pixels_mm': ('normal', 2.0),
+            'voltage': ('normal', 5.0),
+            'distance_mm': ('normal', 0.01),
+            'roomtempc': ('uniform', 1.0),
+            'pressure_torr': ('normal', 5.0),
+            'density_oil': ('normal', 5.0),
+        }
 
     def corrected_viscosity(self, vd):
         if vd <= 0:
             raise ValueError(f"Invalid downward velocity (vd): {vd}. Must be greater than 0.")
+        return self._corrected_viscosity(vd, self.roomtempc, self.pressure_torr)
+
+    def _corrected_viscosity(self, vd, roomtempc, pressure_torr, density_oil=None):
+        density_oil = self.density_oil if density_oil is None else density_oil
         # Initial viscosity without correction
-        eta_0 = 1.8228e-5 + ((4.790e-8) * (self.roomtempc - 21))
+        eta_0 = 1.8228e-5 + ((4.790e-8) * (roomtempc - 21))
         # Radius without correction
-        radius_uncorrected = np.sqrt((9 * eta_0 * vd) / (2 * self.density_oil * self.a_gravity))
+        radius_uncorrected = np.sqrt((9 * eta_0 * vd) / (2 * density_oil * self.a_gravity))
         # Corrected viscosity
-        correction_factor = 1 + (5.908e-5 / (radius_uncorrected * self.pressure_torr))
+        correction_factor = 1 + (5.908e-5 / (radius_uncorrected * pressure_torr))
         return eta_0 / correction_factor
 
-    def find_radius(self, vd, viscosity_air):
+    def find_radius(self, vd, viscosity_air, density_oil=None):
+        density_oil = self.density_oil if density_oil is None else density_oil
         top = (9 * viscosity_air * vd)
-        bot = (2 * self.density_oil * self.a_gravity)
+        bot = (2 * density_oil * self.a_gravity)
         radius = np.sqrt(top / bot)
         return radius
 
-    def find_mass(self, radius):
-        top = self.density_oil * 4 * np.pi * np.power(radius, 3)
+    def find_mass(self, radius, density_oil=None):
+        density_oil = self.density_oil if density_oil is None else density_oil
+        top = density_oil * 4 * np.pi * np.power(radius, 3)
         bot = 3
         mass = top / bot
         return mass
 
+    def _charge(self, mass, viscosity_air, radius, vu, E):
+        return ((mass * self.a_gravity) + (6 * np.pi * viscosity_air * radius * vu)) / E
+
     def find_charge_and_integer(self, vu, vd):
         if vd <= 0 or vu <= 0:
             raise ValueError(f"\nInvalid velocities: \n\tvu={vu}, vd={vd}. \n\tBoth must be greater than 0.")
         viscosity_air = self.corrected_viscosity(vd)
         radius = self.find_radius(vd, viscosity_air)
         mass = self.find_mass(radius)
-        charge = ((mass * self.a_gravity) + (6 * np.pi * viscosity_air * radius * vu)) / self.E
+        charge = self._charge(mass, viscosity_air, radius, vu, self.E)
         integer = charge / 1.602176634e-19  # Elementary charge
         return charge, integer
+
+    def find_charge_and_integer_batch(self, vu, vd, voltage=None, roomtempc=None, pressure_torr=None, distance_mm=None, density_oil=None):
+        """Vectorized find_charge_and_integer for many droplets at once.
+
+        vu and vd are arrays of velocities in m/s. voltage, roomtempc, pressure_torr,
+        distance_mm and density_oil may be scalars or per-droplet arrays and default to
+        this calculator's constants.
+        Returns a dict of arrays (charge, integer, radius, mass, viscosity) plus a 'valid'
+        mask. Droplets whose velocities are not both > 0 are NaN instead of raising.
+        """
+        voltage = self.voltage if voltage is None else voltage
+        roomtempc = self.roomtempc if roomtempc is None else roomtempc
+        pressure_torr = self.pressure_torr if pressure_torr is None else pressure_torr
+        distance_mm = self.distance_mm if distance_mm is None else distance_mm
+        density_oil = self.density_oil if density_oil is None else density_oil
+        vu, vd, voltage, roomtempc, pressure_torr, distance_mm, density_oil = np.broadcast_arrays(
+            np.asarray(vu, dtype=float), np.asarray(vd, dtype=float),
+            np.asarray(voltage, dtype=float), np.asarray(roomtempc, dtype=float), np.asarray(pressure_torr, dtype=float),
+            np.asarray(distance_mm, dtype=float), np.asarray(density_oil, dtype=float),
+        )
+        valid = (vu > 0) & (vd > 0)
+        all_valid = valid.all()
+
+        def take(values):
+            return values if all_valid else values[valid]
+
+        # Same formulas as the scalar path, applied to the valid droplets only
+        vd_valid = take(vd)
+        density_valid = take(density_oil)
+        viscosity_air = self._corrected_viscosity(vd_valid, take(roomtempc), take(pressure_torr), density_valid)
+        radius = self.find_radius(vd_valid, viscosity_air, density_valid)
+        mass = self.find_mass(radius, density_valid)
+        E = take(voltage) / (take(distance_mm) * 1e-3)
+        charge = self._charge(mass, viscosity_air, radius, take(vu), E)
+        integer = charge / 1.602176634e-19  # Elementary charge
+
+        results = {'valid': valid}
+        for key, values in (('charge', charge), ('integer', integer), ('radius', radius), ('mass', mass), ('viscosity', viscosity_air)):
+            if all_valid:
+                results[key] = values
+            else:
+                results[key] = np.full(valid.shape, np.nan)
+                results[key][valid] = values
+        return results
+
+    def sample_parameters(self, samples, rng):
+        """Draw `samples` values of every apparatus parameter in self.uncertainties around its nominal value."""
+        parameters = {}
+        for name, (distribution, width) in self.uncertainties.items():
+            nominal = getattr(self, name)
+            if distribution == 'normal':
+                parameters[name] = rng.normal(nominal, width, samples)
+            elif distribution == 'uniform':
+                parameters[name] = rng.uniform(nominal - width, nominal + width, samples)
+            else:
+                raise ValueError(f"Unknown distribution {distribution!r} for {name}")
+        return parameters
+
+    def charge_uncertainty(self, vu, vd, vu_std, vd_std, samples=100_000, confidence=0.95, seed=None):
+        """Monte Carlo distribution of the charge and q/e of one droplet.
+
+        vu and vd (m/s) are drawn from normal distributions with the given standard
+        deviations and the apparatus parameters from self.uncertainties; the velocities
+        were measured with the nominal pixels_mm, so they scale with the drawn calibration.
+        All samples go through find_charge_and_integer_batch at once. Samples with a
+        non-positive velocity are dropped. Returns the charge and integer samples with
+        their mean, standard deviation and `confidence` interval (low, high).
+        """
+        rng = np.random.default_rng(seed)
+        parameters = self.sample_parameters(samples, rng)
+        pixels_mm = parameters.pop('pixels_mm', self.pixels_mm)
+        scale = self.pixels_mm / pixels_mm
+        vu = rng.normal(vu, vu_std, samples) * scale
+        vd = rng.normal(vd, vd_std, samples) * scale
+        batch = self.find_charge_and_integer_batch(vu, vd, **parameters)
+        valid = batch['valid']
+        results = {'samples': samples, 'valid_fraction': float(valid.mean()), 'confidence': confidence}
+        alpha = (1 - confidence) / 2
+        for key in ('charge', 'integer'):
+            values = batch[key][valid]
+            results[key] = values
+            if len(values):
+                low, high = np.quantile(values, [alpha, 1 - alpha])
+                results.update({f'{key}_mean': float(values.mean()), f'{key}_std': float(values.std()),
+                                f'{key}_low': float(low), f'{key}_high': float(high)})
+        return results
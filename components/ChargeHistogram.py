@@ -0,0 +1,174 @@
+import json
+import numpy as np
+
+class ChargeHistogram:
+    """Histogram of q/e estimates on fixed bins, with running mean, variance and mode.
+
+    Bins are `bin_width` wide and centered on its multiples, so with the default of a
+    quarter every integer q/e has its own bin and the bins never move as values come in.
+    The counts live in an array that only grows to cover new values; adding and
+    removing a value is O(1) and updates the mean and variance with Welford's method.
+    Histograms with the same bin width can be merged, e.g. over many videos or sessions.
+    Values that are not finite are ignored.
+    """
+
+    def __init__(self, bin_width=0.25):
+        if bin_width <= 0:
+            raise ValueError("The bin width must be positive")
+        self.bin_width = float(bin_width)
+        self.clear()
+
+    def clear(self):
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._first = 0  # Bin index of _counts[0]
+        self._n = 0
+        self._mean = 0.0
+        self._m2 = 0.0  # Sum of squared deviations from the mean
+        self._mode = None  # Index into _counts of the fullest bin
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def mean(self):
+        return self._mean if self._n else None
+
+    @property
+    def variance(self):
+        """Sample variance, None below two values."""
+        return self._m2 / (self._n - 1) if self._n > 1 else None
+
+    @property
+    def std(self):
+        variance = self.variance
+        return None if variance is None else float(np.sqrt(max(variance, 0.0)))
+
+    def bin_index(self, value):
+        return int(np.floor(value / self.bin_width + 0.5))
+
+    def bin_center(self, index):
+        return index * self.bin_width
+
+    def mode(self):
+        """Center of the fullest bin (the lowest one on ties), or None while empty."""
+        if not self._n:
+            return None
+        return self.bin_center(self._first + self._mode)
+
+    def add(self, value):
+        if not np.isfinite(value):
+            return
+        value = float(value)
+        row = self._row_for(self.bin_index(value))
+        self._counts[row] += 1
+        if self._mode is None or self._counts[row] > self._counts[self._mode] or (
+                self._counts[row] == self._counts[self._mode] and row < self._mode):
+            self._mode = row
+        self._n += 1
+        delta = value - self._mean
+        self._mean += delta / self._n
+        self._m2 += delta * (value - self._mean)
+
+    def extend(self, values):
+        for value in values:
+            self.add(value)
+
+    def remove(self, value):
+        """Undo add(value), e.g. when playback is rewound past an estimate."""
+        if not np.isfinite(value):
+            return
+        value = float(value)
+        row = self.bin_index(value) - self._first
+        if not 0 <= row < len(self._counts) or self._counts[row] == 0:
+            raise ValueError(f"q/e = {value} is not in the histogram")
+        self._counts[row] -= 1
+        self._n -= 1
+        if not self._n:
+            self.clear()
+            return
+        delta = value - self._mean
+        self._mean -= delta / self._n
+        self._m2 = max(self._m2 - delta * (value - self._mean), 0.0)
+        if row == self._mode:
+            self._mode = int(np.argmax(self._counts))
+
+    def merge(self, other):
+        """Add the values of `other` to this histogram (Chan's update of the mean and variance)."""
+        if other.bin_width != self.bin_width:
+            raise ValueError(f"Cannot merge histograms with bin widths {self.bin_width} and {other.bin_width}")
+        if not other._n:
+            return self
+        occupied = np.flatnonzero(other._counts)
+        self._row_for(other._first + occupied[0])
+        start = self._row_for(other._first + occupied[-1]) - (occupied[-1] - occupied[0])
+        self._counts[start:start + occupied[-1] - occupied[0] + 1] += other._counts[occupied[0]:occupied[-1] + 1]
+        self._mode = int(np.argmax(self._counts))
+
+        n = self._n + other._n
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta ** 2 * self._n * other._n / n
+        self._mean += delta * other._n / n
+        self._n = n
+        return self
+
+    def histogram(self):
+        """(counts, edges) of the bins from the lowest to the highest occupied one."""
+        occupied = np.flatnonzero(self._counts)
+        if not len(occupied):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        counts = self._counts[occupied[0]:occupied[-1] + 1]
+        first = self._first + occupied[0]
+        edges = (np.arange(first, first + len(counts) + 1) - 0.5) * self.bin_width
+        return counts, edges
+
+    def to_dict(self):
+        occupied = np.flatnonzero(self._counts)
+        counts = self._counts[occupied[0]:occupied[-1] + 1] if len(occupied) else self._counts[:0]
+        return {
+            'bin_width': self.bin_width,
+            'first_bin': int(self._first + occupied[0]) if len(occupied) else 0,
+            'counts': counts.tolist(),
+            'count': self._n,
+            'mean': self._mean,
+            'm2': self._m2,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['bin_width'])
+        if data['count']:
+            histogram._counts = np.array(data['counts'], dtype=np.int64)
+            histogram._first = data['first_bin']
+            histogram._n = data['count']
+            histogram._mean = data['mean']
+            histogram._m2 = data['m2']
+            histogram._mode = int(np.argmax(histogram._counts))
+        return histogram
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def _row_for(self, index):
+        """Row of bin `index` in _counts, growing the array (to at least twice its size) to cover it."""
+        if not len(self._counts):
+            self._counts = np.zeros(16, dtype=np.int64)
+            self._first = index - 8
+        row = index - self._first
+        if 0 <= row < len(self._counts):
+            return row
+        size = len(self._counts)
+        grow = max(size, abs(row) if row < 0 else row - size + 1)
+        if row < 0:
+            self._counts = np.concatenate([np.zeros(grow, dtype=np.int64), self._counts])
+            self._first -= grow
+            if self._mode is not None:
+                self._mode += grow
+        else:
+            self._counts = np.concatenate([self._counts, np.zeros(grow, dtype=np.int64)])
+        return index - self._first
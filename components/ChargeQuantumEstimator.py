@@ -0,0 +1,135 @@
+import numpy as np
+
+class ChargeQuantumEstimator:
+    """Estimates the charge quantum e from many droplet charges, without assuming its value.
+
+    Every charge should be close to a whole multiple of e. A periodogram scores candidate
+    quanta q between q_min and q_max by how well the charges line up on multiples of q,
+    |mean(exp(2 pi i c / q))|; the charges are binned into a fine histogram first, so this
+    costs the same for a million charges as for a thousand. Of the candidates that score
+    within `tolerance` of the best one, the largest wins, since every divisor of e fits
+    noise-free data just as well. The quantum is then refined by least squares on the
+    charges' multiples, rejecting charges more than `rejection` robust standard deviations
+    from their multiple. The bootstrap resamples the refined fit.
+
+    A handful of charges always lines up on some quantum in the range, so the result only
+    counts as significant when the peak beats the coherence unrelated charges would reach
+    by chance with probability `significance`; otherwise e and its interval mean nothing.
+    """
+
+    def __init__(self, q_min=0.5e-19, q_max=5e-19, bins=8192, tolerance=0.05, rejection=3.0, iterations=5, significance=0.01):
+        if not 0 < q_min < q_max:
+            raise ValueError("Need 0 < q_min < q_max")
+        self.q_min = q_min
+        self.q_max = q_max
+        self.bins = bins  # Histogram bins the periodogram runs on
+        self.tolerance = tolerance
+        self.rejection = rejection
+        self.iterations = iterations
+        self.significance = significance
+
+    def periodogram(self, charges, quanta=None):
+        """(quanta, coherence) of the charges on a grid uniform in 1/q, or on the given quanta."""
+        charges = np.abs(np.asarray(charges, dtype=float))
+        charges = charges[np.isfinite(charges)]
+        high = self._range(charges)
+        counts, edges = np.histogram(charges, bins=self.bins, range=(0, high))
+        occupied = counts > 0
+        centers = ((edges[:-1] + edges[1:]) / 2)[occupied]
+        weights = counts[occupied] / counts.sum()
+        if quanta is None:
+            # A peak is about 1 / high wide in 1/q, sample it eight times
+            frequencies = np.arange(1 / self.q_max, 1 / self.q_min, 1 / (8 * high))
+            quanta = 1 / frequencies
+        phases = 2 * np.pi * np.outer(1 / np.asarray(quanta), centers)
+        coherence = np.hypot(np.cos(phases) @ weights, np.sin(phases) @ weights)
+        return quanta, coherence
+
+    def chance_coherence(self, charges):
+        """Periodogram peak that charges with random phases exceed with probability `significance`.
+
+        The coherence of n random phases exceeds r with probability exp(-n r^2), and the
+        periodogram holds about (1 / q_min - 1 / q_max) * range independent peaks.
+        """
+        charges = np.abs(np.asarray(charges, dtype=float))
+        charges = charges[np.isfinite(charges)]
+        peaks = max((1 / self.q_min - 1 / self.q_max) * self._range(charges), 1.0)
+        return float(np.sqrt(np.log(peaks / self.significance) / len(charges)))
+
+    def estimate(self, charges, bootstrap=1000, confidence=0.95, seed=None):
+        """Charge quantum of `charges` (coulombs) with a bootstrap confidence interval.
+
+        Returns a dict with e, its confidence interval (e_low, e_high) and standard error,
+        the periodogram peak height (coherence), the height reached by chance
+        (chance_coherence), whether the peak beats it (significant) and the number of
+        inliers and outliers.
+        """
+        charges = np.abs(np.asarray(charges, dtype=float).ravel())
+        charges = charges[np.isfinite(charges)]
+        if len(charges) < 2:
+            raise ValueError("Need at least two charges to estimate the quantum")
+
+        quanta, coherence = self.periodogram(charges)
+        # Local maxima that come close to the best one; the largest quantum among them
+        peaks = np.flatnonzero((coherence[1:-1] >= coherence[:-2]) & (coherence[1:-1] >= coherence[2:])) + 1
+        if not len(peaks):
+            peaks = np.array([np.argmax(coherence)])
+        candidates = peaks[coherence[peaks] >= (1 - self.tolerance) * coherence[peaks].max()]
+        peak = candidates[np.argmax(quanta[candidates])]
+        quantum = quanta[peak]
+
+        for _ in range(self.iterations):
+            multiples = np.rint(charges / quantum)
+            residuals = charges - multiples * quantum
+            inliers = multiples >= 1
+            scale = 1.4826 * np.median(np.abs(residuals[inliers])) if inliers.any() else 0
+            if scale > 0:
+                inliers &= np.abs(residuals) <= self.rejection * scale
+            if not inliers.any():
+                raise ValueError("No charge lies close to a multiple of the quantum")
+            previous = quantum
+            quantum = np.dot(multiples[inliers], charges[inliers]) / np.dot(multiples[inliers], multiples[inliers])
+            if abs(quantum - previous) <= 1e-12 * quantum:
+                break
+
+        chance = self.chance_coherence(charges)
+        low, high, error = self._bootstrap(multiples[inliers], charges[inliers], bootstrap, confidence, seed)
+        return {
+            'e': float(quantum),
+            'e_low': low,
+            'e_high': high,
+            'std_error': error,
+            'confidence': confidence,
+            'coherence': float(coherence[peak]),
+            'chance_coherence': chance,
+            'significant': bool(coherence[peak] >= chance),
+            'inliers': int(inliers.sum()),
+            'outliers': int(len(charges) - inliers.sum()),
+        }
+
+    def _range(self, charges):
+        """Upper end of the charge histogram; far outliers would stretch and blur it, they do not line up anyway."""
+        return np.quantile(charges, 0.995) * 1.05
+
+    def _bootstrap(self, multiples, charges, resamples, confidence, seed, groups=1000):
+        """Percentile interval of the least-squares quantum over resampled (multiple, charge) pairs.
+
+        The fit only depends on the sums of n * c and n * n, so the pairs are summed into
+        `groups` random groups of equal size and the groups are resampled; for independent
+        charges the group sums are independent too and this is much cheaper than resampling
+        every charge.
+        """
+        if not resamples:
+            return None, None, None
+        rng = np.random.default_rng(seed)
+        cross = multiples * charges
+        squares = multiples * multiples
+        if len(charges) > groups:
+            labels = rng.permutation(len(charges)) % groups
+            cross = np.bincount(labels, cross, groups)
+            squares = np.bincount(labels, squares, groups)
+        picks = rng.integers(0, len(cross), size=(resamples, len(cross)))
+        quanta = cross[picks].sum(axis=1) / squares[picks].sum(axis=1)
+        alpha = (1 - confidence) / 2
+        low, high = np.quantile(quanta, [alpha, 1 - alpha])
+        return float(low), float(high), float(quanta.std(ddof=1))
@@ -0,0 +1,335 @@
+import math
+from bisect import bisect_left, bisect_right
+import numpy as np
+from util import enforce_endpoint_rules, fit_segments, select_by_distance, slopes_to_velocities
+
+def left_base(values, index, sign):
+    """Lowest of sign * values from `index` back to the nearest higher sample, scipy's left base."""
+    height = sign * values[index]
+    lowest = height
+    stop, block = index, 64
+    while stop > 0:
+        start = max(0, stop - block)
+        part = sign * values[start:stop]
+        higher = np.flatnonzero(part > height)
+        if len(higher):
+            part = part[higher[-1] + 1:]
+            return min(lowest, part.min()) if len(part) else lowest
+        lowest = min(lowest, part.min())
+        stop, block = start, 2 * block
+    return lowest
+
+def scan_right_base(values, index, sign, start, lowest):
+    """Carry a right-base scan of the extremum at `index` over values[start:].
+
+    Returns the lowest of sign * values seen since the extremum and whether a higher
+    sample has closed the base; an open base can still go lower as samples arrive.
+    """
+    part = sign * values[start:]
+    higher = np.flatnonzero(part > sign * values[index])
+    if len(higher):
+        part = part[:higher[0]]
+    if len(part):
+        lowest = min(lowest, part.min())
+    return lowest, bool(len(higher))
+
+class LocalMaxima:
+    """Local maxima of sign * y found so far, for one kind of extremum of a StreamingExtremaDetector."""
+
+    def __init__(self, sign):
+        self.sign = sign
+        # Sample and plateau edges of every maximum since shortly before the last barrier, in order
+        self.index = []
+        self.left_edges = []
+        self.right_edges = []
+        self.checked = 0  # Maxima before this position have been checked for being a barrier
+        self.barrier = None  # Position of the last barrier
+        self.decided = []  # Kept by the distance rule and prominent, not settled yet
+        self.pending = []  # [index, left base, right base, scanned up to] of kept ones not prominent yet
+
+class StreamingExtremaDetector:
+    """Incremental replacement for running find_peaks over the whole y-center history.
+
+    The samples are read from `samples`, a function returning every sample so far
+    (the y-centers handed on by a TrajectoryBuffer, as views of it), and never copied.
+    The distance rule keeps the highest of any maxima closer than `distance` (the
+    earliest of equal ones, see util.select_by_distance), which can chain along a noisy
+    series, so update() cuts the series at barriers: maxima that go before every other
+    maximum within `distance` on both sides. A barrier is always kept and removes
+    everything around it, so no chain crosses it and the rule selects the same between
+    two barriers as on the whole series. Each section is decided once, when the barrier
+    that closes it is confirmed; only the samples after the last barrier are searched again.
+
+    Prominence is measured on the whole series, like find_peaks does. It only grows as
+    samples arrive, so a prominent extremum is final, and one that is not prominent yet
+    stays pending until it is, or until a higher sample on its right fixes it for good.
+    peaks and troughs are always those of util.find_peaks_and_troughs on the samples so
+    far, which is find_peaks(y, distance, prominence) with its ties broken by position.
+
+    Velocities come from least-squares lines fitted to every rising and falling
+    segment between consecutive extrema; segments between settled extrema are
+    fitted once and cached. `fps` is the video's frame rate and `calibration` the
+    pixels per mm of the display frame.
+    """
+
+    def __init__(self, samples, distance=100, prominence=100, fps=30.0, calibration=414.20):
+        self.samples = samples
+        self.distance = distance
+        self.prominence = prominence
+        self.fps = fps
+        self.calibration = calibration
+        self._y = np.array([])  # Samples read by the last update()
+        self._length = 0
+        self._reset_extrema()
+
+        self.peaks = np.array([], dtype=int)
+        self.troughs = np.array([], dtype=int)
+
+    def _reset_extrema(self):
+        self._complete = 0  # Every local maximum before this sample has been found
+        self._maxima = {1: LocalMaxima(1), -1: LocalMaxima(-1)}
+        # Extrema before self._settled are final, and their segments fitted
+        self._settled = 0
+        self._settled_peaks = []
+        self._settled_troughs = []
+        self._settled_segments = []  # fit_segments results between settled extrema
+        self._settled_slopes = []
+        self._last_settled = None  # Frame of the last settled extremum
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def y(self):
+        """The samples as of the last update()."""
+        return self._y
+
+    def truncate(self, length):
+        """Start over when the samples were cut back to `length`, e.g. when playback is rewound.
+
+        The extrema are found again over the remaining samples, since the dropped ones
+        may have confirmed a barrier or closed the base of an extremum that was let go.
+        """
+        if length >= self._length:
+            return
+        self._y = np.array([])
+        self._length = 0
+        self._reset_extrema()
+        self.update()
+
+    def update(self):
+        """Read the samples and find peaks and troughs in those that are not settled yet."""
+        self._y = np.asarray(self.samples())
+        n = self._length = len(self._y)
+        if n == 0:
+            self.peaks = np.array([], dtype=int)
+            self.troughs = np.array([], dtype=int)
+            return self.peaks, self.troughs
+
+        # Maxima are final once their plateau has closed, the trailing run of equal samples has not
+        y = self.y
+        complete = n - 1
+        while complete > self._complete and y[complete - 1] == y[complete]:
+            complete -= 1
+        provisional = {}
+        for maxima in self._maxima.values():
+            if complete > self._complete:
+                self._find_maxima(maxima)
+                self._find_barriers(maxima, complete)
+            self._review_pending(maxima)
+            provisional[maxima.sign] = self._provisional(maxima)
+        self._complete = max(self._complete, complete)
+        self._settle_decided()
+
+        peaks, troughs = self._maxima[1], self._maxima[-1]
+        self.peaks, self.troughs = enforce_endpoint_rules(
+            np.array(self._settled_peaks + peaks.decided + provisional[1], dtype=int),
+            np.array(self._settled_troughs + troughs.decided + provisional[-1], dtype=int),
+            n,
+        )
+        return self.peaks, self.troughs
+
+    def velocities(self):
+        """(vu, vd) in m/s, the same as find_velocities(y, peaks, troughs, fps, calibration).
+
+        Only the segments after the last settled extremum are fitted again.
+        """
+        if self._length == 0:
+            return slopes_to_velocities([], self.fps, self.calibration)
+        slopes = np.concatenate([self._settled_slopes, self._pending_segments()['slope']])
+        return slopes_to_velocities(slopes, self.fps, self.calibration)
+
+    def segments(self):
+        """Every fitted segment in order: start, end, slope (pixels per frame), intercept,
+        rms residual (pixels) and velocity (m/s, positive when falling)."""
+        parts = self._settled_segments + ([self._pending_segments()] if self._length else [])
+        segments = {name: np.concatenate([part[name] for part in parts]) if parts else np.array([])
+                    for name in ('start', 'end', 'slope', 'intercept', 'rms')}
+        segments['velocity'] = segments['slope'] * self.fps / self.calibration * 1e-3
+        return segments
+
+    def velocity_errors(self):
+        """Standard errors of (vu, vd) in m/s.
+
+        With several segments in a direction, the standard error of their median slope;
+        with a single one, the standard error of its least-squares slope.
+        """
+        segments = self.segments()
+        errors = []
+        for direction in (segments['slope'] <= 0, segments['slope'] > 0):
+            slopes = segments['slope'][direction]
+            if len(slopes) > 1:
+                error = 1.2533 * slopes.std(ddof=1) / np.sqrt(len(slopes))
+            elif len(slopes) == 1:
+                n = float(segments['end'][direction][0] - segments['start'][direction][0] + 1)
+                error = segments['rms'][direction][0] * np.sqrt(12 / (n * (n * n - 1)) * n / max(n - 2, 1))
+            else:
+                error = 0.0
+            errors.append(abs(error) * self.fps / self.calibration * 1e-3)
+        return tuple(errors)
+
+    def _find_maxima(self, maxima):
+        """Add the maxima whose plateau closed since the last update."""
+        from scipy.signal import find_peaks  # Slow to import, the app warms it up after startup
+
+        # The sample before self._complete differs from it, so no plateau is cut off
+        start = max(self._complete - 1, 0)
+        found, properties = find_peaks(maxima.sign * self.y[start:], plateau_size=1)
+        maxima.index.extend(int(i) for i in found + start)
+        maxima.left_edges.extend(int(i) for i in properties['left_edges'] + start)
+        maxima.right_edges.extend(int(i) for i in properties['right_edges'] + start)
+
+    def _find_barriers(self, maxima, complete):
+        """Check the maxima whose neighbourhood is complete, deciding the section before every barrier."""
+        reach = math.ceil(self.distance)  # find_peaks' distance rule
+        values = maxima.sign * self.y
+        index = maxima.index
+        while maxima.checked < len(index) and index[maxima.checked] + reach <= complete:
+            position = maxima.checked
+            maxima.checked += 1
+            height = values[index[position]]
+            first = bisect_left(index, index[position] - reach + 1)
+            last = bisect_right(index, index[position] + reach - 1)
+            # Equal maxima before it go first, equal ones after it do not
+            if (all(values[neighbour] < height for neighbour in index[first:position])
+                    and all(values[neighbour] <= height for neighbour in index[position + 1:last])):
+                self._decide_section(maxima, position)
+
+    def _decide_section(self, maxima, position):
+        """Select the extrema from the last barrier up to the new one at `position`, and drop what is no longer needed."""
+        start, after = self._section_start(maxima)
+        stop = maxima.right_edges[position] + 2  # Include the lower sample that closes the plateau
+        for index in self._select(maxima.sign, start, stop):
+            if index > after:
+                self._judge(maxima, int(index))
+        maxima.barrier = position
+
+        # Later barrier checks only look back `distance` from maxima after this one
+        cut = bisect_left(maxima.index, maxima.index[position] - math.ceil(self.distance) + 1)
+        for edges in (maxima.index, maxima.left_edges, maxima.right_edges):
+            del edges[:cut]
+        maxima.checked -= cut
+        maxima.barrier -= cut
+
+    def _select(self, sign, start, stop):
+        """Maxima of sign * y[start:stop] kept by the distance rule, as indices into y."""
+        from scipy.signal import find_peaks
+
+        values = sign * self.y[start:stop]
+        found, _ = find_peaks(values)
+        return found[select_by_distance(found, values[found], self.distance)] + start
+
+    def _section_start(self, maxima):
+        """First sample of the section after the last barrier, and the barrier's index (-1 before the first)."""
+        if maxima.barrier is None:
+            return 0, -1
+        return maxima.left_edges[maxima.barrier] - 1, maxima.index[maxima.barrier]
+
+    def _prominence(self, sign, index):
+        """Prominence of the extremum at `index` as it stands, with the state to carry its right base forward."""
+        height = sign * self._y[index]
+        left = left_base(self.y, index, sign)
+        right, closed = scan_right_base(self.y, index, sign, index + 1, height)
+        # In double precision like find_peaks, the samples may be float32
+        return float(height) - float(max(left, right)), left, right, closed
+
+    def _judge(self, maxima, index):
+        """Keep a decided extremum if it is prominent, or wait for its prominence to grow while it can."""
+        prominence, left, right, closed = self._prominence(maxima.sign, index)
+        if prominence >= self.prominence:
+            maxima.decided.append(index)
+        elif not closed:
+            maxima.pending.append([index, left, right, self._length])
+
+    def _review_pending(self, maxima):
+        """Keep the pending extrema that became prominent and let go of those whose base closed."""
+        still_open = []
+        for entry in maxima.pending:
+            index, left, right, scanned = entry
+            right, closed = scan_right_base(self.y, index, maxima.sign, scanned, right)
+            if float(maxima.sign * self._y[index]) - float(max(left, right)) >= self.prominence:
+                maxima.decided.append(index)
+            elif not closed:
+                entry[2:] = right, self._length
+                still_open.append(entry)
+        if len(still_open) < len(maxima.pending):
+            maxima.decided.sort()
+        maxima.pending = still_open
+
+    def _provisional(self, maxima):
+        """Extrema after the last barrier, selected again on every update."""
+        start, after = self._section_start(maxima)
+        return [int(index) for index in self._select(maxima.sign, start, self._length)
+                if index > after and self._prominence(maxima.sign, index)[0] >= self.prominence]
+
+    def _settle_decided(self):
+        """Settle the decided extrema before the earlier of the two last barriers and fit their segments."""
+        peaks, troughs = self._maxima[1], self._maxima[-1]
+        if peaks.barrier is None or troughs.barrier is None:
+            return
+        settled = min(peaks.index[peaks.barrier], troughs.index[troughs.barrier]) + 1
+        new = {}
+        for maxima in (peaks, troughs):
+            new[maxima.sign] = [index for index in maxima.decided if index < settled]
+            maxima.decided = [index for index in maxima.decided if index >= settled]
+        self._settled = max(self._settled, settled)
+        if not new[1] and not new[-1]:
+            return
+        if self._last_settled is not None and min(new[1] + new[-1]) <= self._last_settled:
+            # A pending extremum became prominent after the ones around it settled, fit again
+            self._settled_peaks = sorted(self._settled_peaks + new[1])
+            self._settled_troughs = sorted(self._settled_troughs + new[-1])
+            self._rebuild_settled_slopes()
+        else:
+            self._settle(np.array(new[1], dtype=int), np.array(new[-1], dtype=int))
+
+    def _pending_segments(self):
+        extrema = np.concatenate([self.peaks, self.troughs])
+        if self._last_settled is not None:
+            extrema = np.append(extrema[extrema > self._last_settled], self._last_settled)
+        return fit_segments(self.y, extrema)
+
+    def _settle(self, peaks, troughs):
+        self._settled_peaks.extend(int(p) for p in peaks)
+        self._settled_troughs.extend(int(t) for t in troughs)
+        new = np.sort(np.concatenate([peaks, troughs]).astype(int))
+        if self._last_settled is None:
+            # The first frame always counts as a trough
+            self._last_settled = 0
+            new = new[new > 0]
+        if len(new):
+            segments = fit_segments(self.y, np.append(self._last_settled, new))
+            self._settled_segments.append(segments)
+            self._settled_slopes.extend(segments['slope'])
+            self._last_settled = int(new[-1])
+
+    def _rebuild_settled_slopes(self):
+        peaks = np.array(self._settled_peaks, dtype=int)
+        troughs = np.array(self._settled_troughs, dtype=int)
+        self._settled_peaks = []
+        self._settled_troughs = []
+        self._settled_segments = []
+        self._settled_slopes = []
+        self._last_settled = None
+        if self._settled > 0:
+            self._settle(peaks, troughs)
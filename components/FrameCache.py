@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from util import read_frame_at
+
+class FrameCache:
+    """Thread-safe LRU cache of resized frames with a hard limit on the bytes it holds."""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, index):
+        with self._lock:
+            return index in self._frames
+
+    def __len__(self):
+        return len(self._frames)
+
+    def get(self, index):
+        with self._lock:
+            frame = self._frames.get(index)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(index)
+            self.hits += 1
+            return frame
+
+    def put(self, index, frame):
+        if frame.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._frames.pop(index, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._frames[index] = frame
+            self.nbytes += frame.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {'frames': len(self._frames), 'bytes': self.nbytes, 'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
+
+class FramePrefetcher:
+    """Fills a FrameCache in the direction of travel from its own VideoCapture.
+
+    request() only records the latest position; the worker thread abandons an
+    unfinished prefetch as soon as a newer request comes in.
+    """
+
+    def __init__(self, video_path, cache, size=(512, 512), ahead=30):
+        self.video_path = video_path
+        self.cache = cache
+        self.size = size
+        self.ahead = ahead
+        self._request = None
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="FramePrefetcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+
+    def request(self, index, direction):
+        """Prefetch the frames after `index` (direction >= 0) or before it (direction < 0)."""
+        with self._condition:
+            self._request = (index, direction)
+            self._condition.notify()
+
+    def _pending(self):
+        return self._stopped or self._request is not None
+
+    def _run(self):
+        import cv2
+
+        video = cv2.VideoCapture(self.video_path)
+        position = 0
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(self._pending)
+                    if self._stopped:
+                        return
+                    index, direction = self._request
+                    self._request = None
+
+                if direction >= 0:
+                    indices = range(index + 1, index + 1 + self.ahead)
+                else:
+                    # Decoding only runs forwards, so fill the window behind in order
+                    indices = range(max(0, index - self.ahead), index)
+
+                for i in indices:
+                    if self._pending():
+                        break
+                    if i in self.cache:
+                        continue
+                    ret, frame = read_frame_at(video, i, position)
+                    if not ret:
+                        position = None  # Unknown, seek on the next read
+                        break
+                    position = i + 1
+                    self.cache.put(i, cv2.resize(frame, self.size))
+        finally:
+            video.release()
@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+
+class FrameReader:
+    """Decodes and resizes video frames on a background thread into a bounded queue.
+
+    The producer blocks while the queue is full, so at most `depth` decoded frames are
+    held in memory. get() never blocks; it raises queue.Empty when no frame is ready yet
+    and returns None once the end of the video has been reached.
+    """
+
+    def __init__(self, video_path, start_frame=0, size=(512, 512), depth=8, timer=None):
+        self.video_path = video_path
+        self.start_frame = start_frame
+        self.size = size
+        self.depth = depth
+        self.queue = queue.Queue(maxsize=depth)
+        self.timer = timer  # Optional StageTimer for the decode and resize stages
+
+        self.frames_decoded = 0
+        self.producer_stalls = 0  # Decode had to wait because the queue was full
+        self.consumer_stalls = 0  # Playback asked for a frame before one was ready
+        self._consumer_waiting = False
+
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="FrameReader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the decode thread and drop any frames still in the queue."""
+        self._stop_event.set()
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    def get(self):
+        """Return the next (frame index, frame), or None at the end of the video."""
+        try:
+            item = self.queue.get_nowait()
+        except queue.Empty:
+            # Count each wait once, however often playback polls during it
+            if not self._consumer_waiting:
+                self.consumer_stalls += 1
+                self._consumer_waiting = True
+            raise
+        self._consumer_waiting = False
+        return item
+
+    def stats(self):
+        """Queue occupancy and stall counters: a full queue with consumer stalls near zero
+        means tracking/UI is the bottleneck, an empty one with many consumer stalls means decode is."""
+        return {
+            'occupancy': self.queue.qsize(),
+            'depth': self.depth,
+            'frames_decoded': self.frames_decoded,
+            'producer_stalls': self.producer_stalls,
+            'consumer_stalls': self.consumer_stalls,
+        }
+
+    def _run(self):
+        import cv2
+
+        video = cv2.VideoCapture(self.video_path)
+        try:
+            if self.start_frame > 0:
+                video.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+            index = self.start_frame
+            while not self._stop_event.is_set():
+                start = self.timer.start() if self.timer is not None else None
+                ret, frame = video.read()
+                if not ret:
+                    break
+                if start is not None:
+                    decoded = time.perf_counter()
+                    self.timer.add('decode', decoded - start, index)
+                frame = cv2.resize(frame, self.size)
+                if start is not None:
+                    self.timer.stop('resize', decoded, index)
+                self.frames_decoded += 1
+                if not self._put((index, frame)):
+                    return
+                index += 1
+            self._put(None)  # End of video
+        finally:
+            video.release()
+
+    def _put(self, item):
+        """Put with backpressure, giving up only when the reader is stopped."""
+        stalled = False
+        while not self._stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                if not stalled:
+                    self.producer_stalls += 1
+                    stalled = True
+        return False
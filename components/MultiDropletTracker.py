@@ -0,0 +1,105 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from .ExtremaDetector import StreamingExtremaDetector
+from .TrajectoryBuffer import TrajectoryBuffer
+from .Trackers import create_tracker
+
+class DropletTrack:
+    """Tracking state of a single droplet: its tracker, trajectory, y-center detector and charge estimates."""
+
+    def __init__(self, tracker, bbox, frame_index, distance=100, prominence=100, tracker_type=None, fps=30.0, capacity=1024):
+        self.tracker = tracker
+        self.tracker_type = tracker_type
+        self.bbox = bbox
+        self.restart_trajectory(frame_index, bbox, capacity)
+        self.extrema_detector = StreamingExtremaDetector(self.flushed_y_centers, distance=distance, prominence=prominence, fps=fps)
+        self.charge_history = []  # (frame index, charge, integer) of every batch estimate
+        self.store = None  # Optional TrajectoryStore the flushed samples are appended to
+
+    def restart_trajectory(self, start_frame, initial_bbox, capacity=1024):
+        """Empty trajectory that starts from `initial_bbox` on `start_frame`."""
+        self.start_frame = start_frame
+        self.initial_bbox = initial_bbox
+        self.trajectory = TrajectoryBuffer(capacity, start_frame + 1)  # Tracked frames after the initial one
+
+    def flushed_y_centers(self):
+        """Flushed y-centers of the current trajectory, read by the detector without copying them."""
+        return self.trajectory.flushed_y_centers()
+
+    def bbox_at(self, frame_index):
+        """Box of the droplet on `frame_index`, or None if it was not tracked there."""
+        if frame_index == self.start_frame:
+            return self.initial_bbox
+        return self.trajectory.bbox(frame_index)
+
+class MultiDropletTracker:
+    """Tracks several droplets from a single decode pass.
+
+    The trackers of all droplets are updated on the same frame through a thread pool;
+    OpenCV releases the GIL inside tracker.update, so the updates run concurrently.
+    """
+
+    def __init__(self, tracker_type='CSRT', max_workers=None, distance=100, prominence=100, fps=30.0, total_frames=None):
+        self.tracker_type = tracker_type
+        self.distance = distance
+        self.prominence = prominence
+        self.fps = fps  # Frame rate of the video, for the droplets' velocities
+        self.total_frames = total_frames  # Frame count of the video, sizes the trajectory buffers
+        self.droplets = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count(), thread_name_prefix="DropletTracker")
+
+    def __len__(self):
+        return len(self.droplets)
+
+    def __iter__(self):
+        return iter(self.droplets)
+
+    def add(self, frame, bbox, frame_index, tracker_type=None):
+        """Start tracking a new droplet from `bbox` on `frame`."""
+        tracker_type = tracker_type or self.tracker_type
+        tracker = create_tracker(tracker_type)
+        tracker.init(frame, bbox)
+        droplet = DropletTrack(tracker, bbox, frame_index, self.distance, self.prominence, tracker_type, self.fps,
+                               self.trajectory_capacity(frame_index))
+        self.droplets.append(droplet)
+        return droplet
+
+    def trajectory_capacity(self, frame_index):
+        """Rows needed to hold every frame after `frame_index`."""
+        return self.total_frames - frame_index if self.total_frames else 1024
+
+    def clear(self):
+        self.droplets = []
+
+    def update(self, frame, frame_index, interpolate=False):
+        """Update every droplet on `frame` and record the tracked boxes. Returns [(ok, bbox)].
+
+        With `interpolate`, frames skipped since a droplet's last box are filled in linearly.
+        Droplets already tracked on `frame_index`, e.g. resumed from a later frame than the
+        others, are not updated until playback gets past their trajectory; their saved box
+        is returned instead.
+        """
+        active = [droplet for droplet in self.droplets if droplet.trajectory.end_frame <= frame_index]
+        if len(active) == 1:
+            updates = [active[0].tracker.update(frame)]
+        else:
+            updates = list(self._executor.map(lambda droplet: droplet.tracker.update(frame), active))
+
+        updated = {}
+        for droplet, (ok, bbox) in zip(active, updates):
+            if ok:
+                droplet.bbox = bbox
+                droplet.trajectory.append(frame_index, bbox, interpolate)
+            updated[id(droplet)] = (ok, bbox)
+
+        results = []
+        for droplet in self.droplets:
+            if id(droplet) in updated:
+                results.append(updated[id(droplet)])
+            else:
+                bbox = droplet.bbox_at(frame_index)
+                results.append((bbox is not None, bbox))
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+def video_fingerprint(video_path, chunk_size=1024 * 1024, chunks=8):
+    """Fast content hash of a video: its size plus a few evenly spaced chunks."""
+    size = os.path.getsize(video_path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(video_path, 'rb') as f:
+        if size <= chunk_size * chunks:
+            digest.update(f.read())
+        else:
+            for offset in np.linspace(0, size - chunk_size, chunks).astype(int):
+                f.seek(int(offset))
+                digest.update(f.read(chunk_size))
+    return digest.hexdigest()
+
+class ResultCache:
+    """Content-addressed on-disk cache of tracking results with LRU eviction.
+
+    Entries are keyed by the video's content hash plus the initial ROIs, tracker types
+    and detection parameters, and hold the per-droplet results of AnalysisEngine
+    (trajectory, bbox history, charge history and the final vu/vd/charge). The least
+    recently used entries are deleted once the cache grows past max_bytes.
+    """
+
+    ARRAY_FIELDS = ('y_centers', 'peaks', 'troughs')
+    BBOX_FIELDS = {'bbox_frames': 'bbox_frames', 'bboxes': 'bbox_values'}  # Result field -> array name
+
+    def __init__(self, directory=os.path.join('output', 'cache'), max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._fingerprints = {}  # (path, size, mtime) -> hash, so a video is only hashed once per session
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # Access order comes from the entry files' mtimes, so it survives restarts
+        self._entries = {}
+        for name in os.listdir(directory):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(directory, name))
+                self._entries[name[:-4]] = (stat.st_mtime, stat.st_size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def set_fingerprint(self, video_path, fingerprint, size, mtime):
+        """Use a content hash computed elsewhere (e.g. by VideoCatalog) for this size and mtime of the video."""
+        self._fingerprints[(os.path.abspath(video_path), size, mtime)] = fingerprint
+
+    def key(self, video_path, droplets, params):
+        """Cache key for tracking `droplets` [(start_frame, bbox, tracker_type)] in a video with `params`."""
+        stat = os.stat(video_path)
+        file_id = (os.path.abspath(video_path), stat.st_size, stat.st_mtime)
+        if file_id not in self._fingerprints:
+            self._fingerprints[file_id] = video_fingerprint(video_path)
+        description = {
+            'video': self._fingerprints[file_id],
+            'droplets': [[int(start_frame), [float(v) for v in bbox], tracker_type] for start_frame, bbox, tracker_type in droplets],
+            'params': params,
+        }
+        return hashlib.blake2b(json.dumps(description, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+    def get(self, key):
+        """Return the cached per-droplet results for `key`, or None."""
+        path = self._path(key)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with np.load(path) as data:
+                    results = self._unpack(data)
+            except (OSError, ValueError, KeyError):
+                # Damaged or removed behind our back, treat as a miss
+                self._remove(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            os.utime(path)
+            self._entries[key] = (os.stat(path).st_mtime, self._entries[key][1])
+        return results
+
+    def put(self, key, results):
+        """Store per-droplet results under `key` and evict old entries past the size limit."""
+        path = self._path(key)
+        arrays = self._pack(results)
+        with self._lock:
+            with open(path + '.tmp', 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(path + '.tmp', path)
+            stat = os.stat(path)
+            self._entries[key] = (stat.st_mtime, stat.st_size)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': sum(size for _, size in self._entries.values()),
+            'max_bytes': self.max_bytes,
+        }
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        total = sum(size for _, size in self._entries.values())
+        for key in sorted(self._entries, key=lambda k: self._entries[k][0]):
+            if total <= self.max_bytes:
+                break
+            total -= self._entries[key][1]
+            self._remove(key)
+            self.evictions += 1
+
+    def _pack(self, results):
+        arrays = {}
+        fields = []
+        for index, result in enumerate(results):
+            scalars = {}
+            for name, value in result.items():
+                if name in self.ARRAY_FIELDS:
+                    arrays[f"{index}_{name}"] = np.asarray(value)
+                elif name in self.BBOX_FIELDS:
+                    arrays[f"{index}_{self.BBOX_FIELDS[name]}"] = np.asarray(value)
+                elif name == 'charge_history':
+                    arrays[f"{index}_charge_history"] = np.array(value, dtype=float).reshape(-1, 3)
+                else:
+                    scalars[name] = value
+            fields.append(scalars)
+        arrays['results'] = np.array(json.dumps(fields))
+        return arrays
+
+    def _unpack(self, data):
+        results = []
+        for index, scalars in enumerate(json.loads(str(data['results']))):
+            result = dict(scalars)
+            if 'bbox' in result:
+                result['bbox'] = tuple(result['bbox'])
+            for name in self.ARRAY_FIELDS:
+                if f"{index}_{name}" in data:
+                    result[name] = data[f"{index}_{name}"]
+            for name, array_name in self.BBOX_FIELDS.items():
+                if f"{index}_{array_name}" in data:
+                    result[name] = data[f"{index}_{array_name}"]
+            if f"{index}_charge_history" in data:
+                result['charge_history'] = [(int(frame), charge, integer) for frame, charge, integer in data[f"{index}_charge_history"].tolist()]
+            results.append(result)
+        return results
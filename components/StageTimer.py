@@ -0,0 +1,96 @@
+import csv
+import threading
+import time
+import numpy as np
+
+class StageTimer:
+    """Rolling timings of the stages of the playback loop.
+
+    Wrap a stage with `start = timer.start()` and `timer.stop('stage', start, frame_index)`.
+    While disabled, start() returns None and stop() returns straight away, so the hooks
+    can stay in the hot path. The last `window` durations of every stage are kept in
+    ring buffers for the live statistics, and every timed frame is kept as one row for
+    the CSV export. The decode thread records its stages too, so the buffers are only
+    touched under a lock.
+    """
+
+    def __init__(self, window=300, enabled=False):
+        self.window = window
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._durations = {}  # stage -> [ring buffer, number of samples]
+            self._frame_ends = np.zeros(self.window)
+            self._frames = 0
+            self.rows = {}  # frame index -> {stage: seconds}
+
+    def start(self):
+        return time.perf_counter() if self.enabled else None
+
+    def stop(self, stage, start, frame_index=None):
+        if start is None:
+            return
+        self.add(stage, time.perf_counter() - start, frame_index)
+
+    def add(self, stage, seconds, frame_index=None):
+        """Record a duration measured elsewhere, e.g. on the decode thread."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if stage not in self._durations:
+                self._durations[stage] = [np.zeros(self.window), 0]
+            entry = self._durations[stage]
+            entry[0][entry[1] % self.window] = seconds
+            entry[1] += 1
+            if frame_index is not None:
+                self.rows.setdefault(frame_index, {})[stage] = seconds
+
+    def end_frame(self):
+        """Mark a frame as shown, for the effective frame rate."""
+        if not self.enabled:
+            return
+        self._frame_ends[self._frames % self.window] = time.perf_counter()
+        self._frames += 1
+
+    def fps(self):
+        count = min(self._frames, self.window)
+        if count < 2:
+            return 0.0
+        ends = self._frame_ends[:count]
+        return (count - 1) / (ends.max() - ends.min())
+
+    def stats(self):
+        """Mean, p95 and max in ms of every stage over the window."""
+        with self._lock:
+            recent_durations = [(stage, durations[:min(count, self.window)] * 1e3) for stage, (durations, count) in self._durations.items()]
+        stats = {}
+        for stage, recent in recent_durations:
+            stats[stage] = {
+                'mean_ms': float(recent.mean()),
+                'p95_ms': float(np.percentile(recent, 95)),
+                'max_ms': float(recent.max()),
+            }
+        return stats
+
+    def summary(self):
+        """A few lines of text with the live numbers."""
+        lines = [f"{self.fps():5.1f} fps"]
+        for stage, s in self.stats().items():
+            lines.append(f"{stage:>8} {s['mean_ms']:6.2f} {s['p95_ms']:6.2f} {s['max_ms']:6.2f} ms")
+        return "\n".join(lines)
+
+    def write_csv(self, path):
+        """Write one row per timed frame, one column per stage, in milliseconds."""
+        with self._lock:
+            stages = list(self._durations)
+            rows = {frame_index: dict(row) for frame_index, row in self.rows.items()}
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['frame'] + [f"{stage}_ms" for stage in stages])
+            for frame_index in sorted(rows):
+                row = rows[frame_index]
+                writer.writerow([frame_index] + [f"{row[stage] * 1e3:.4f}" if stage in row else '' for stage in stages])
+        return len(rows)
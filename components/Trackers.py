@@ -0,0 +1,175 @@
+from operator import attrgetter
+import numpy as np
+
+class TemplateMatchTracker:
+    """Finds the initial ROI again in a search window around its last position."""
+
+    def __init__(self, search_margin=20, min_score=0.3):
+        self.search_margin = search_margin
+        self.min_score = min_score  # Normalized correlation below this counts as lost
+        self.template = None
+        self.bbox = None
+
+    def init(self, frame, bbox):
+        import cv2
+
+        x, y, w, h = (int(v) for v in bbox)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.template = gray[y:y + h, x:x + w].copy()
+        self.bbox = (x, y, w, h)
+
+    def update(self, frame):
+        import cv2
+
+        x, y, w, h = self.bbox
+        frame_height, frame_width = frame.shape[:2]
+        x0 = max(0, x - self.search_margin)
+        y0 = max(0, y - self.search_margin)
+        x1 = min(frame_width, x + w + self.search_margin)
+        y1 = min(frame_height, y + h + self.search_margin)
+        if x1 - x0 < w or y1 - y0 < h:
+            return False, self.bbox
+
+        region = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        scores = cv2.matchTemplate(region, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, location = cv2.minMaxLoc(scores)
+        if score < self.min_score:
+            return False, self.bbox
+        self.bbox = (x0 + location[0], y0 + location[1], w, h)
+        return True, self.bbox
+
+class CentroidTracker:
+    """Re-centers the box on the intensity-weighted centroid of the pixels around it.
+
+    The droplets are bright blobs on a darker field, so the sub-pixel centroid of the
+    pixels brighter than the window mean (from cv2.moments) follows the droplet for a
+    few tens of microseconds per frame. The search window is centered on the last
+    position every frame.
+
+    `confidence` compares the bright mass inside the box, and its share of the
+    window's bright mass, with a running average of both over the trusted frames:
+    1 while the blob looks as it did recently, towards 0 when it suddenly fades or
+    clutter pulls the centroid away; slow changes such as drifting out of focus
+    follow the average. Below `min_confidence` the tracker hands over to a `fallback`
+    tracker (CSRT by default), initialized on the last trusted frame and box. The
+    centroid takes over again once it is confident twice over around the fallback's box.
+    """
+
+    def __init__(self, search_margin=10, min_confidence=0.3, fallback='CSRT', adaptation=0.1):
+        self.search_margin = search_margin
+        self.min_confidence = min_confidence
+        self.adaptation = adaptation  # Weight of the newest frame in the running reference
+        self.fallback = fallback  # Tracker type used while the blob is lost, None to report it lost
+        self.fallback_tracker = None
+        self.confidence = 0.0
+        self.reference = None  # Running (mass, share) of the blob
+        self.bbox = None
+        self._trusted = None  # (frame, bbox) of the last frame the centroid was trusted on
+
+    def init(self, frame, bbox):
+        self.bbox = tuple(float(v) for v in bbox)
+        self.fallback_tracker = None
+        self.reference = None
+        self._centroid(frame, self.bbox)  # Sets the reference unless the box starts out dark
+        self.confidence = 1.0
+        self._trusted = (frame, self.bbox)
+
+    def update(self, frame):
+        if self.fallback_tracker is None:
+            bbox, blob = self._centroid(frame, self.bbox)
+            if bbox is not None and self.confidence >= self.min_confidence:
+                self._accept(frame, bbox, blob)
+                return True, self.bbox
+            if self.fallback is None:
+                return False, self.bbox
+            trusted_frame, trusted_bbox = self._trusted
+            self.fallback_tracker = create_tracker(self.fallback)
+            self.fallback_tracker.init(trusted_frame, tuple(int(round(v)) for v in trusted_bbox))
+
+        ok, fallback_bbox = self.fallback_tracker.update(frame)
+        if ok:
+            # Same box size as before, centered where the fallback found the droplet
+            x, y, w, h = self.bbox
+            fx, fy, fw, fh = fallback_bbox
+            self.bbox = (fx + fw / 2 - w / 2, fy + fh / 2 - h / 2, w, h)
+        bbox, blob = self._centroid(frame, self.bbox)
+        if bbox is not None and self.confidence >= min(1.0, 2 * self.min_confidence):
+            # The blob is back, refine the fallback's box and drop the fallback
+            self.fallback_tracker = None
+            self._accept(frame, bbox, blob)
+            return True, self.bbox
+        return ok, self.bbox
+
+    def _accept(self, frame, bbox, blob):
+        self.bbox = bbox
+        self._trusted = (frame, bbox)
+        if self.reference is not None:
+            rate = self.adaptation
+            self.reference = tuple((1 - rate) * old + rate * new for old, new in zip(self.reference, blob))
+
+    def _centroid(self, frame, bbox):
+        """Box centered on the bright-pixel centroid around `bbox`, with the bright mass inside
+        it and that mass's share of the window. Sets self.confidence; the box is None when
+        the window has no bright pixels. Without a reference yet, the first blob found becomes it.
+        """
+        import cv2
+
+        x, y, w, h = bbox
+        frame_height, frame_width = frame.shape[:2]
+        x0 = max(0, int(x) - self.search_margin)
+        y0 = max(0, int(y) - self.search_margin)
+        x1 = min(frame_width, int(x + w) + self.search_margin)
+        y1 = min(frame_height, int(y + h) + self.search_margin)
+        self.confidence = 0.0
+        if x1 <= x0 or y1 <= y0:
+            return None, (0.0, 0.0)
+
+        window = frame[y0:y1, x0:x1]
+        if window.ndim == 3:
+            window = cv2.cvtColor(window, cv2.COLOR_BGR2GRAY)
+        weights = window.astype(np.float32)
+        weights -= cv2.mean(weights)[0]
+        np.maximum(weights, 0, out=weights)
+        moments = cv2.moments(weights)
+        total = moments['m00']
+        if total <= 0:
+            return None, (0.0, 0.0)
+
+        cx = x0 + moments['m10'] / total
+        cy = y0 + moments['m01'] / total
+        bbox = (cx - w / 2, cy - h / 2, w, h)
+
+        # Bright mass inside the re-centered box
+        bx0 = min(max(int(round(bbox[0])) - x0, 0), x1 - x0)
+        by0 = min(max(int(round(bbox[1])) - y0, 0), y1 - y0)
+        mass = float(weights[by0:by0 + int(h), bx0:bx0 + int(w)].sum())
+        share = mass / total
+        if self.reference is None and mass > 0:
+            # Tracking started without a blob in the box, the first one found is the reference
+            self.reference = (mass, share)
+        if self.reference is not None:
+            reference_mass, reference_share = self.reference
+            self.confidence = min(1.0, mass / reference_mass) * min(1.0, share / reference_share)
+        return bbox, (mass, share)
+
+# OpenCV factories are looked up by name when a tracker is created, so a build without one of
+# the contrib trackers still imports and cv2 is not loaded before the first tracker.
+# MOSSE is left out: it loses the droplet on the first update in the bundled videos.
+TRACKER_TYPES = {
+    'CSRT': 'TrackerCSRT_create',
+    'KCF': 'TrackerKCF_create',
+    'MIL': 'TrackerMIL_create',
+    'Template': TemplateMatchTracker,
+    'Centroid': CentroidTracker,
+}
+
+def create_tracker(tracker_type='CSRT'):
+    """Create a tracker with the OpenCV init(frame, bbox) / update(frame) interface."""
+    if tracker_type not in TRACKER_TYPES:
+        raise ValueError(f"Unknown tracker type: {tracker_type}. Choose one of {', '.join(TRACKER_TYPES)}.")
+    factory = TRACKER_TYPES[tracker_type]
+    if isinstance(factory, str):
+        import cv2  # Slow to import
+
+        factory = attrgetter(factory)(cv2)
+    return factory()
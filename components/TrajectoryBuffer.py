@@ -0,0 +1,145 @@
+import numpy as np
+
+class TrajectoryBuffer:
+    """Tracked boxes of one droplet in a preallocated structured array, one row per frame.
+
+    Row i holds frame start_frame + i: the box, its y-center and whether the tracker
+    found the droplet on that frame, in 21 bytes. Frames are written in order; frames
+    that were skipped stay invalid, and rewinding only moves the end back. Valid rows
+    up to `flushed` have been handed on by flush() (to the detector and the trajectory
+    store), the ones after it form the current batch.
+    """
+
+    DTYPE = np.dtype([('bbox', '<f4', (4,)), ('y_center', '<f4'), ('valid', '?')])
+
+    def __init__(self, capacity, start_frame=0):
+        self.start_frame = start_frame
+        self._set_rows(np.zeros(max(int(capacity), 1), dtype=self.DTYPE))
+        self._end = 0  # Rows written so far, valid or not
+        self._count = 0  # Valid rows
+        self._flushed_end = 0
+        self.flushed = 0  # Valid rows handed on by flush()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def end_frame(self):
+        """One past the last frame written."""
+        return self.start_frame + self._end
+
+    @property
+    def nbytes(self):
+        return self._rows.nbytes
+
+    def pending(self):
+        """Number of valid samples since the last flush()."""
+        return self._count - self.flushed
+
+    def append(self, frame_index, bbox, interpolate=False):
+        """Record the tracked box of `frame_index`, which must come after every frame written so far.
+
+        With `interpolate`, frames skipped since the previous box are filled in linearly
+        between the two boxes instead of staying invalid.
+        """
+        previous = self._end - 1
+        row = self._row_for_write(frame_index, 1)
+        self._bbox[row] = bbox
+        self._y_center[row] = bbox[1] + bbox[3] / 2
+        self._valid[row] = True
+        if interpolate and 0 <= previous < row - 1 and self._valid[previous]:
+            fraction = (np.arange(1, row - previous, dtype=np.float32) / (row - previous))[:, None]
+            gap = slice(previous + 1, row)
+            self._bbox[gap] = self._bbox[previous] + fraction * (self._bbox[row] - self._bbox[previous])
+            self._y_center[gap] = self._bbox[gap, 1] + self._bbox[gap, 3] / 2
+            self._valid[gap] = True
+            self._count += row - previous - 1
+        self._end = row + 1
+        self._count += 1
+
+    def extend(self, frames, bboxes):
+        """append() for many increasing frames at once."""
+        frames = np.asarray(frames, dtype=int)
+        if len(frames) == 0:
+            return
+        bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+        first = self._row_for_write(frames[0], frames[-1] - frames[0] + 1)
+        rows = frames - self.start_frame
+        end = rows[-1] + 1
+        self._valid[first:end] = False
+        self._bbox[rows] = bboxes
+        self._y_center[rows] = bboxes[:, 1] + bboxes[:, 3] / 2
+        self._valid[rows] = True
+        self._end = end
+        self._count += len(frames)
+
+    def bbox(self, frame_index):
+        """Tracked box of `frame_index` as a tuple, or None if there is none."""
+        row = frame_index - self.start_frame
+        if 0 <= row < self._end and self._valid[row]:
+            return tuple(self._bbox[row].tolist())
+        return None
+
+    def truncate(self, frame_index):
+        """Forget `frame_index` and every frame after it, e.g. when playback is rewound."""
+        row = min(max(frame_index - self.start_frame, 0), self._end)
+        valid = self._valid
+        self._count -= int(np.count_nonzero(valid[row:self._end]))
+        if row < self._flushed_end:
+            self.flushed -= int(np.count_nonzero(valid[row:self._flushed_end]))
+            self._flushed_end = row
+        self._end = row
+
+    def flush(self):
+        """(frames, bboxes, y_centers) of the valid samples since the last flush, as views when none are missing."""
+        rows = self._rows[self._flushed_end:self._end]
+        frames = np.arange(self.start_frame + self._flushed_end, self.start_frame + self._end)
+        if self.pending() != len(rows):
+            frames, rows = frames[rows['valid']], rows[rows['valid']]
+        self._flushed_end = self._end
+        self.flushed = self._count
+        return frames, rows['bbox'], rows['y_center']
+
+    def frames(self):
+        """Frame index of every valid sample."""
+        frames = np.arange(self.start_frame, self.start_frame + self._end)
+        return frames if self._count == self._end else frames[self._valid[:self._end]]
+
+    def bboxes(self):
+        """Boxes of the valid samples, a view of the buffer when no frame is missing."""
+        return self._valid_rows()['bbox']
+
+    def y_centers(self):
+        """Y-centers in pixels of the valid samples, a view of the buffer when no frame is missing."""
+        return self._valid_rows()['y_center']
+
+    def flushed_frames(self):
+        """Frame index of every sample handed on by flush()."""
+        return self.frames()[:self.flushed]
+
+    def flushed_y_centers(self):
+        """Y-centers of the samples handed on by flush(), what the droplet's detector searches."""
+        return self.y_centers()[:self.flushed]
+
+    def _valid_rows(self):
+        rows = self._rows[:self._end]
+        return rows if self._count == self._end else rows[rows['valid']]
+
+    def _row_for_write(self, frame_index, count):
+        row = frame_index - self.start_frame
+        if row < self._end:
+            raise ValueError(f"Frame {frame_index} is before the end of the trajectory ({self.end_frame}), truncate first")
+        if row + count > len(self._rows):
+            # Only when the video turns out longer than its reported frame count
+            grown = np.zeros(max(row + count, 2 * len(self._rows)), dtype=self.DTYPE)
+            grown[:self._end] = self._rows[:self._end]
+            self._set_rows(grown)
+        self._valid[self._end:row] = False  # Skipped frames
+        return row
+
+    def _set_rows(self, rows):
+        self._rows = rows
+        # Field views, indexing them is much cheaper than going through a structured row
+        self._bbox = rows['bbox']
+        self._y_center = rows['y_center']
+        self._valid = rows['valid']
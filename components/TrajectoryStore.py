@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import numpy as np
+
+class TrajectoryStore:
+    """Append-only, columnar on-disk trajectory of one droplet.
+
+    Each column is a raw little-endian file that only ever grows by whole batches,
+    next to a metadata.json that records how many rows have been committed. Rows past
+    the committed length (from a crash in the middle of a flush) are ignored and cut
+    off when the store is reopened. read() memory-maps the columns, so reading back a
+    long trajectory does not copy it.
+    """
+
+    COLUMNS = {
+        'frame': (np.dtype('<i4'), ()),
+        'bbox': (np.dtype('<f8'), (4,)),
+        'y_center': (np.dtype('<f8'), ()),
+    }
+    METADATA_FILE = 'metadata.json'
+
+    def __init__(self, directory, metadata=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        metadata_path = os.path.join(directory, self.METADATA_FILE)
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                self.metadata = json.load(f)
+        else:
+            self.metadata = dict(metadata or {}, length=0)
+            self._write_metadata()
+        self._truncate_columns(self.metadata['length'])
+
+    def __len__(self):
+        return self.metadata['length']
+
+    @classmethod
+    def open_all(cls, root):
+        """Open every droplet store under `root`, in droplet order."""
+        if not os.path.isdir(root):
+            return []
+        names = sorted(
+            (name for name in os.listdir(root) if os.path.exists(os.path.join(root, name, cls.METADATA_FILE))),
+            key=lambda name: int(name.rsplit('_', 1)[-1]),
+        )
+        return [cls(os.path.join(root, name)) for name in names]
+
+    @staticmethod
+    def remove_all(root):
+        shutil.rmtree(root, ignore_errors=True)
+
+    def append(self, frames, bboxes, y_centers):
+        """Append a batch of rows and commit them."""
+        columns = {
+            'frame': np.asarray(frames),
+            'bbox': np.asarray(bboxes).reshape(-1, 4),
+            'y_center': np.asarray(y_centers),
+        }
+        count = len(columns['frame'])
+        if count == 0:
+            return
+        for name, (dtype, _) in self.COLUMNS.items():
+            with open(self._column_path(name), 'ab') as f:
+                f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        self.metadata['length'] += count
+        self._write_metadata()
+
+    def truncate(self, length):
+        """Drop every row from `length` onwards, e.g. after rewinding."""
+        length = max(0, min(length, len(self)))
+        if length == len(self):
+            return
+        self.metadata['length'] = length
+        self._write_metadata()
+        self._truncate_columns(length)
+
+    def read(self):
+        """Return the committed columns as read-only memory-mapped arrays."""
+        length = len(self)
+        data = {}
+        for name, (dtype, shape) in self.COLUMNS.items():
+            if length == 0:
+                data[name] = np.empty((0,) + shape, dtype=dtype)
+            else:
+                data[name] = np.memmap(self._column_path(name), dtype=dtype, mode='r', shape=(length,) + shape)
+        return data
+
+    def _column_path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def _truncate_columns(self, length):
+        for name, (dtype, shape) in self.COLUMNS.items():
+            path = self._column_path(name)
+            size = length * dtype.itemsize * int(np.prod(shape))
+            if not os.path.exists(path):
+                open(path, 'wb').close()
+            elif os.path.getsize(path) > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+
+    def _write_metadata(self):
+        # Write-then-rename, so a crash never leaves a half-written length behind
+        path = os.path.join(self.directory, self.METADATA_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.metadata, f, indent=2)
+        os.replace(path + '.tmp', path)
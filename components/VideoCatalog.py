@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .ResultCache import video_fingerprint
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov')
+
+class VideoCatalog:
+    """Frame count, frame rate, size, duration, thumbnail and content hash of the videos in a directory.
+
+    Entries are kept in a sidecar index, a `.catalog` folder next to the videos (under
+    output/catalog when that directory is not writable), so a directory opens from the
+    index straight away on later launches. refresh() only probes videos that are new or
+    whose size or mtime changed since they were indexed, on a thread pool, and hands
+    every entry to a callback as soon as it is ready.
+    """
+
+    INDEX_VERSION = 1
+
+    def __init__(self, directory, cache_dir=None, workers=4, thumbnail_size=128):
+        self.directory = directory
+        self.cache_dir = cache_dir or self.default_cache_dir(directory)
+        self.workers = workers
+        self.thumbnail_size = thumbnail_size  # Longest side in pixels
+        self.entries = {}  # File name -> entry, as last indexed
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def default_cache_dir(directory):
+        if os.access(directory, os.W_OK):
+            return os.path.join(directory, '.catalog')
+        key = hashlib.sha1(os.path.abspath(directory).encode()).hexdigest()[:16]
+        return os.path.join('output', 'catalog', key)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def names(self):
+        """Sorted file names of the videos in the directory."""
+        return sorted(f for f in os.listdir(self.directory) if f.lower().endswith(VIDEO_EXTENSIONS))
+
+    def load(self):
+        """Read the index; the entries are not checked against the files until refresh()."""
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get('version') == self.INDEX_VERSION:
+            self.entries = index['videos']
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            index = {'version': self.INDEX_VERSION, 'videos': dict(self.entries)}
+        temporary = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(temporary, self.index_path)
+
+    def get(self, name):
+        with self._lock:
+            return self.entries.get(name)
+
+    def is_current(self, name):
+        """Whether the indexed entry of `name` still describes the file."""
+        entry = self.get(name)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(os.path.join(self.directory, name))
+        except OSError:
+            return False
+        return entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime
+
+    def refresh(self, on_entry=None):
+        """Probe new and changed videos, forget removed ones and save the index.
+
+        `on_entry(entry)` is called from this thread for every probed entry as it completes.
+        Returns the entries of all videos in name order.
+        """
+        names = self.names()
+        with self._lock:
+            removed = [name for name in self.entries if name not in names]
+            for name in removed:
+                self._remove_thumbnail(self.entries.pop(name))
+        stale = [name for name in names if not self.is_current(name)]
+        if stale:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="VideoCatalog") as pool:
+                futures = [pool.submit(self.probe, name) for name in stale]
+                for future in as_completed(futures):
+                    entry = future.result()
+                    with self._lock:
+                        self.entries[entry['name']] = entry
+                    if on_entry is not None:
+                        on_entry(entry)
+        if stale or removed:
+            self.save()
+        return [self.get(name) for name in names]
+
+    def probe(self, name):
+        """Open a video and describe it. Videos that cannot be read get an entry with an error."""
+        import cv2
+
+        path = os.path.join(self.directory, name)
+        stat = os.stat(path)
+        entry = {'name': name, 'size': stat.st_size, 'mtime': stat.st_mtime, 'frames': 0, 'fps': 0.0,
+                 'width': 0, 'height': 0, 'duration': 0.0, 'hash': None, 'thumbnail': None, 'error': None}
+        video = cv2.VideoCapture(path)
+        try:
+            if not video.isOpened():
+                entry['error'] = "Could not open video"
+                return entry
+            fps = video.get(cv2.CAP_PROP_FPS)
+            entry.update({
+                'frames': int(video.get(cv2.CAP_PROP_FRAME_COUNT)),
+                'fps': fps if fps > 0 else 0.0,
+                'width': int(video.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                'height': int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            })
+            if entry['fps']:
+                entry['duration'] = entry['frames'] / entry['fps']
+            ret, frame = video.read()
+            if ret:
+                entry['thumbnail'] = self._write_thumbnail(name, frame)
+            else:
+                entry['error'] = "Could not read the first frame"
+        finally:
+            video.release()
+        entry['hash'] = video_fingerprint(path)
+        return entry
+
+    def thumbnail_path(self, entry):
+        return os.path.join(self.cache_dir, entry['thumbnail']) if entry and entry.get('thumbnail') else None
+
+    def _write_thumbnail(self, name, frame):
+        import cv2
+
+        height, width = frame.shape[:2]
+        scale = self.thumbnail_size / max(height, width)
+        thumbnail = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+        file_name = hashlib.sha1(name.encode()).hexdigest()[:16] + '.jpg'
+        cv2.imwrite(os.path.join(self.cache_dir, file_name), thumbnail)
+        return file_name
+
+    def _remove_thumbnail(self, entry):
+        path = self.thumbnail_path(entry)
+        if path is not None and os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,178 @@
+import os
+import queue
+import threading
+import numpy as np
+from util import video_fps
+from .TrajectoryStore import TrajectoryStore
+
+BOX_COLOR = (255, 0, 0)  # Blue in BGR, like the boxes on the canvas
+TEXT_COLOR = (0, 255, 255)
+
+def annotate(frame, frame_index, bboxes):
+    """Copy of a BGR frame with the tracked boxes, droplet numbers and frame number drawn on it.
+
+    `bboxes` holds one (x, y, w, h) per droplet, or None for a droplet not tracked on this frame.
+    """
+    import cv2
+
+    frame = frame.copy()
+    numbered = len(bboxes) > 1
+    for number, bbox in enumerate(bboxes, 1):
+        if bbox is None:
+            continue
+        x, y, w, h = (int(round(v)) for v in bbox)
+        cv2.rectangle(frame, (x, y), (x + w, y + h), BOX_COLOR, 2)
+        if numbered:
+            cv2.putText(frame, str(number), (x, max(y - 4, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.4, BOX_COLOR, 1, cv2.LINE_AA)
+    cv2.putText(frame, f"Frame {frame_index}", (5, frame.shape[0] - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.5, TEXT_COLOR, 1, cv2.LINE_AA)
+    return frame
+
+class VideoExporter:
+    """Draws the tracking overlay on frames and encodes them with cv2.VideoWriter on a background thread.
+
+    write() only puts the frame and its boxes on a bounded queue, so playback and tracking
+    never wait for drawing or encoding. When the queue is full the frame is dropped and
+    counted rather than making the caller wait, unless `block` is set (offline rendering,
+    where waiting is fine). Frames must not be modified after they are handed over.
+    If encoding fails the writer thread stops and keeps the exception in `error`.
+    """
+
+    def __init__(self, path, fps, size, depth=32, fourcc='mp4v', block=False):
+        self.path = path
+        self.fps = fps
+        self.size = size  # (width, height) of the frames
+        self.depth = depth
+        self.fourcc = fourcc
+        self.block = block
+        self.queue = queue.Queue(maxsize=depth)
+
+        self.frames_written = 0
+        self.frames_dropped = 0  # Queue was full, the writer fell behind
+        self.last_frame = None  # Index of the last frame handed over
+        self.error = None  # Exception that stopped the writer thread
+
+        self._writer = None
+        self._thread = threading.Thread(target=self._run, name="VideoExporter", daemon=True)
+
+    def start(self):
+        import cv2
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.size)
+        if not self._writer.isOpened():
+            raise IOError(f"Could not open {self.path} for writing")
+        self._thread.start()
+        return self
+
+    def write(self, frame_index, frame, bboxes):
+        """Queue a frame for export; returns False if it was dropped.
+
+        Frames at or before the last one handed over are skipped, so replaying after a
+        rewind does not write them twice.
+        """
+        if self.last_frame is not None and frame_index <= self.last_frame:
+            return False
+        self.last_frame = frame_index
+        item = (frame_index, frame, [None if bbox is None else tuple(bbox) for bbox in bboxes])
+        if self.block:
+            if not self._put(item):
+                raise IOError(f"Could not write {self.path}: {self.error}")
+            return True
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+        return True
+
+    def close(self):
+        """Write the frames still queued and finish the file."""
+        if self._writer is None:
+            return
+        self._put(None)
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._writer = None
+
+    def stats(self):
+        return {
+            'occupancy': self.queue.qsize(),
+            'depth': self.depth,
+            'frames_written': self.frames_written,
+            'frames_dropped': self.frames_dropped,
+        }
+
+    def _put(self, item):
+        """Put with backpressure, giving up once the writer thread has stopped."""
+        while self._thread.is_alive():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self):
+        import cv2
+
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                frame_index, frame, bboxes = item
+                if frame.shape[1::-1] != tuple(self.size):
+                    frame = cv2.resize(frame, self.size)
+                self._writer.write(annotate(frame, frame_index, bboxes))
+                self.frames_written += 1
+        except (cv2.error, OSError) as e:
+            self.error = e
+        finally:
+            self._writer.release()
+
+def render_trajectory(video_path, trajectory_path, path, fourcc='mp4v'):
+    """Re-render the annotated video of a saved session from its trajectory stores, without tracking.
+
+    Covers the frames from the first to the last tracked one, at the display size the
+    boxes were tracked at. Returns the number of frames written.
+    """
+    import cv2
+
+    stores = [store for store in TrajectoryStore.open_all(trajectory_path) if len(store)]
+    if not stores:
+        raise IOError(f"No saved trajectory in {trajectory_path}")
+    size = tuple(stores[0].metadata['display_size'])
+    tracks = []
+    for store in stores:
+        data = store.read()
+        frames, boxes = np.asarray(data['frame']), np.asarray(data['bbox'])
+        start_frame = int(store.metadata['start_frame'])
+        if frames[0] != start_frame:
+            # The selected box is stored in the metadata, tracking starts on the next frame
+            frames = np.concatenate([[start_frame], frames])
+            boxes = np.concatenate([[store.metadata['initial_bbox']], boxes])
+        tracks.append((frames, boxes))
+    first = min(int(store.metadata['start_frame']) for store in stores)
+    last = max(int(frames[-1]) for frames, _ in tracks)
+
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise IOError(f"Could not open video {video_path}")
+    exporter = VideoExporter(path, video_fps(video), size, block=True).start()
+    try:
+        video.set(cv2.CAP_PROP_POS_FRAMES, first)
+        for frame_index in range(first, last + 1):
+            ret, frame = video.read()
+            if not ret:
+                break
+            bboxes = []
+            for frames, boxes in tracks:
+                row = np.searchsorted(frames, frame_index)
+                bboxes.append(boxes[row] if row < len(frames) and frames[row] == frame_index else None)
+            exporter.write(frame_index, cv2.resize(frame, size), bboxes)
+    finally:
+        video.release()
+        exporter.close()
+    if exporter.error is not None:
+        raise IOError(f"Could not write {path}: {exporter.error}")
+    return exporter.frames_written
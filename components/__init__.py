@@ -1,2 +1,18 @@
 # from .{File} import {Class}
-from .ChargeCalculator import ChargeCalculator
\ No newline at end of file
+from .ChargeCalculator import ChargeCalculator
+from .ChargeHistogram import ChargeHistogram
+from .ChargeQuantumEstimator import ChargeQuantumEstimator
+from .AnalysisEngine import AnalysisEngine
+from .ExtremaDetector import StreamingExtremaDetector
+from .FrameReader import FrameReader
+from .FrameCache import FrameCache, FramePrefetcher
+from .Trackers import TRACKER_TYPES, create_tracker
+from .MultiDropletTracker import DropletTrack, MultiDropletTracker
+from .TrajectoryStore import TrajectoryStore
+from .ResultCache import ResultCache, video_fingerprint
+from .DropletDetector import DropletDetector
+from .BlitManager import BlitManager
+from .StageTimer import StageTimer
+from .TrajectoryBuffer import TrajectoryBuffer
+from .VideoCatalog import VideoCatalog
+from .VideoExporter import VideoExporter, render_trajectory
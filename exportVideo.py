@@ -0,0 +1,27 @@
+import argparse
+import os
+import time
+from components import render_trajectory
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-render the annotated video of a saved tracking session without tracking again.")
+    parser.add_argument('videos', nargs='+', help="Videos tracked in the annotation tool")
+    parser.add_argument('--output-dir', default='output', help="Directory holding the <video>/trajectory folders saved by the annotation tool")
+    parser.add_argument('--fourcc', default='mp4v', help="cv2.VideoWriter codec")
+    args = parser.parse_args()
+
+    for video_path in args.videos:
+        base_name = os.path.basename(video_path).split('.')[0]
+        directory = os.path.join(args.output_dir, base_name)
+        path = os.path.join(directory, 'annotated.mp4')
+        start_time = time.perf_counter()
+        try:
+            frames = render_trajectory(video_path, os.path.join(directory, 'trajectory'), path, fourcc=args.fourcc)
+        except IOError as e:
+            print(f"{video_path}: {e}")
+            continue
+        elapsed = time.perf_counter() - start_time
+        print(f"{video_path}: wrote {frames} frames to {path} in {elapsed:.2f} s ({frames / elapsed:.0f} frames/s)")
+
+if __name__ == "__main__":
+    main()
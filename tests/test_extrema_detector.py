@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+from scipy.signal import find_peaks
+from components import StreamingExtremaDetector
+from util import enforce_endpoint_rules, find_peaks_and_troughs
+
+def stream(y, step):
+    """Detector fed `y` in batches of `step` samples, updated after every batch."""
+    samples = {'y': y[:0]}
+    detector = StreamingExtremaDetector(lambda: samples['y'], distance=100, prominence=100)
+    for end in range(step, len(y) + step, step):
+        samples['y'] = y[:end]
+        detector.update()
+    return detector
+
+class StreamingExtremaDetectorTest(unittest.TestCase):
+
+    def assert_extrema(self, detector, peaks, troughs):
+        np.testing.assert_array_equal(detector.peaks, peaks)
+        np.testing.assert_array_equal(detector.troughs, troughs)
+
+    def test_matches_find_peaks_on_random_walks(self):
+        rng = np.random.default_rng(0)
+        for _ in range(30):
+            y = np.cumsum(rng.normal(0, 8, 1400))
+            peaks, _ = find_peaks(y, distance=100, prominence=100)
+            troughs, _ = find_peaks(-y, distance=100, prominence=100)
+            for step in (1, 50, 1400):
+                self.assert_extrema(stream(y, step), *enforce_endpoint_rules(peaks, troughs, len(y)))
+
+    def test_equal_maxima_on_quantized_trajectories(self):
+        # Tracked boxes are whole pixels, so equal maxima closer than `distance` are common
+        rng = np.random.default_rng(1)
+        t = np.arange(1500)
+        for _ in range(30):
+            period = rng.integers(150, 400)
+            triangle = 200 + 150 * np.abs((t / period) % 1 * 2 - 1)
+            walk = np.cumsum(rng.normal(0, 8, len(t)))
+            for y in (np.round(triangle + rng.normal(0, 1.5, len(t))), np.round(walk) + 0.5):
+                y = y.astype(np.float32)  # As stored in the trajectory buffer
+                for step in (7, 50):
+                    self.assert_extrema(stream(y, step), *find_peaks_and_troughs(y))
+
+    def test_plateau_ties_go_to_the_earliest(self):
+        y = np.zeros(400)
+        y[100:103] = y[150] = 300  # Equal peaks 50 frames apart, the plateau's middle is kept
+        y[250] = -300
+        peaks, troughs = find_peaks_and_troughs(y)
+        self.assertIn(101, peaks)
+        self.assertNotIn(150, peaks)
+        self.assert_extrema(stream(y, 10), peaks, troughs)
+
+    def test_truncate_finds_the_extrema_again(self):
+        rng = np.random.default_rng(2)
+        y = np.round(np.cumsum(rng.normal(0, 8, 1400)))
+        samples = {'y': y}
+        detector = StreamingExtremaDetector(lambda: samples['y'], distance=100, prominence=100)
+        detector.update()
+        samples['y'] = y[:700]
+        detector.truncate(700)
+        self.assert_extrema(detector, *find_peaks_and_troughs(y[:700]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+import numpy as np
+from components.Trackers import CentroidTracker
+
+def frame_with_blob(x=None, y=None):
+    """Dark 120x120 frame with a bright 8x8 blob whose top-left corner is at (x, y)."""
+    frame = np.full((120, 120, 3), 20, np.uint8)
+    if x is not None:
+        frame[y:y + 8, x:x + 8] = 230
+    return frame
+
+class CentroidTrackerTest(unittest.TestCase):
+
+    def test_follows_a_moving_blob(self):
+        tracker = CentroidTracker(fallback=None)
+        tracker.init(frame_with_blob(50, 50), (48, 48, 12, 12))
+        for step in range(1, 6):
+            ok, (x, y, w, h) = tracker.update(frame_with_blob(50 + step, 50 + 2 * step))
+            self.assertTrue(ok)
+        self.assertAlmostEqual(x + w / 2, 58.5, places=3)
+        self.assertAlmostEqual(y + h / 2, 63.5, places=3)
+
+    def test_starts_on_a_dark_frame(self):
+        for fallback in (None, 'CSRT'):
+            tracker = CentroidTracker(fallback=fallback)
+            tracker.init(frame_with_blob(), (48, 48, 12, 12))
+            self.assertIsNone(tracker.reference)
+            ok, (x, y, w, h) = tracker.update(frame_with_blob(52, 50))
+            self.assertTrue(ok)
+            self.assertIsNone(tracker.fallback_tracker)
+            self.assertEqual(tracker.confidence, 1.0)
+            self.assertAlmostEqual(x + w / 2, 55.5, places=3)
+            self.assertAlmostEqual(y + h / 2, 53.5, places=3)
+
+if __name__ == '__main__':
+    unittest.main()
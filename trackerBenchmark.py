@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import time
+import cv2
+import numpy as np
+from components import TRACKER_TYPES, create_tracker
+from batchAnalysis import collect_videos, load_rois
+
+REFERENCE_TRACKER = 'CSRT'
+
+def track_video(video_path, bbox, tracker_type, max_frames=None, size=(512, 512)):
+    """Track one video and return per-frame update latencies (s) and y-centers (NaN where lost)."""
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise IOError(f"Could not open video {video_path}")
+    try:
+        ret, frame = video.read()
+        if not ret:
+            raise IOError(f"Could not read the first frame of the video {video_path}")
+        tracker = create_tracker(tracker_type)
+        tracker.init(cv2.resize(frame, size), tuple(int(v) for v in bbox))
+
+        latencies = []
+        y_centers = []
+        while max_frames is None or len(latencies) < max_frames:
+            ret, frame = video.read()
+            if not ret:
+                break
+            frame = cv2.resize(frame, size)
+            start = time.perf_counter()
+            ok, tracked = tracker.update(frame)
+            latencies.append(time.perf_counter() - start)
+            y_centers.append(tracked[1] + tracked[3] / 2 if ok else np.nan)
+    finally:
+        video.release()
+    return np.array(latencies), np.array(y_centers, dtype=float)
+
+def latency_stats(latencies):
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1e3
+    return {
+        'frames': len(latencies),
+        'mean_ms': float(latencies.mean() * 1e3),
+        'p50_ms': float(p50),
+        'p90_ms': float(p90),
+        'p99_ms': float(p99),
+        'max_ms': float(latencies.max() * 1e3),
+        'fps': float(1 / latencies.mean()),
+    }
+
+def drift_stats(y_centers, reference):
+    """Distance in pixels between a y-center trajectory and the reference one."""
+    n = min(len(y_centers), len(reference))
+    y_centers, reference = y_centers[:n], reference[:n]
+    both = ~np.isnan(y_centers) & ~np.isnan(reference)
+    stats = {'lost_fraction': float(np.isnan(y_centers).mean()) if n else 0.0}
+    if both.any():
+        error = np.abs(y_centers[both] - reference[both])
+        stats.update({
+            'mean_drift_px': float(error.mean()),
+            'rms_drift_px': float(np.sqrt(np.mean(error ** 2))),
+            'max_drift_px': float(error.max()),
+        })
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame latency and accuracy of each tracker backend.")
+    parser.add_argument('inputs', nargs='*', default=[os.path.join('Videos', 'Videos')], help="Video files, directories or glob patterns")
+    parser.add_argument('--rois', default=os.path.join('benchmarks', 'rois.json'), help="JSON file mapping video file names to initial ROIs")
+    parser.add_argument('--trackers', nargs='+', default=list(TRACKER_TYPES), choices=list(TRACKER_TYPES))
+    parser.add_argument('--max-frames', type=int, help="Only track the first N frames of each video")
+    parser.add_argument('--output', help="Write the results as JSON")
+    args = parser.parse_args()
+
+    rois = load_rois(args.rois)
+    trackers = [REFERENCE_TRACKER] + [t for t in args.trackers if t != REFERENCE_TRACKER]
+    cv2.setNumThreads(1)  # Compare single-core cost
+
+    results = {tracker_type: {'latencies': [], 'videos': {}} for tracker_type in trackers}
+    for video_path in collect_videos(args.inputs):
+        name = os.path.basename(video_path)
+        if name not in rois:
+            print(f"Skipping {name}: no ROI in {args.rois}")
+            continue
+        reference = None
+        for tracker_type in trackers:
+            latencies, y_centers = track_video(video_path, rois[name][0], tracker_type, args.max_frames)
+            if tracker_type == REFERENCE_TRACKER:
+                reference = y_centers
+            video_result = latency_stats(latencies)
+            video_result.update(drift_stats(y_centers, reference))
+            results[tracker_type]['videos'][name] = video_result
+            results[tracker_type]['latencies'].append(latencies)
+            print(f"{name:>8} {tracker_type:>8}: p50 {video_result['p50_ms']:7.3f} ms, "
+                  f"drift {video_result.get('mean_drift_px', float('nan')):7.2f} px")
+
+    summary = {}
+    print(f"\n{'Tracker':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'fps':>8} {'drift px':>9} {'lost':>6}")
+    for tracker_type in trackers:
+        if not results[tracker_type]['latencies']:
+            continue
+        videos = results[tracker_type]['videos'].values()
+        drifts = [v['mean_drift_px'] for v in videos if 'mean_drift_px' in v]
+        summary[tracker_type] = latency_stats(np.concatenate(results[tracker_type]['latencies']))
+        summary[tracker_type]['mean_drift_px'] = float(np.mean(drifts)) if drifts else None
+        summary[tracker_type]['lost_fraction'] = float(np.mean([v['lost_fraction'] for v in videos]))
+        summary[tracker_type]['videos'] = results[tracker_type]['videos']
+        s = summary[tracker_type]
+        drift = f"{s['mean_drift_px']:9.2f}" if s['mean_drift_px'] is not None else f"{'-':>9}"
+        print(f"{tracker_type:>8} {s['p50_ms']:8.3f} {s['p90_ms']:8.3f} {s['p99_ms']:8.3f} {s['max_ms']:8.3f} "
+              f"{s['fps']:8.0f} {drift} {s['lost_fraction']:6.1%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'reference': REFERENCE_TRACKER, 'trackers': summary}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,183 @@
-import cv2
+import hashlib
+import math
+import os
 import numpy as np
 
 def extract_video_properties(video):
+    import cv2
+
     total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
     frame_width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
     return total_frames, frame_width, frame_height
 
-def find_slopes(peaks, troughs):
-    points = sorted(peaks + troughs, key=lambda x: x[0])
-
-    # Calculate slopes between consecutive points
-    positive_slopes = []
-    negative_slopes = []
-    for i in range(1, len(points)):
-        x1, y1 = points[i - 1]
-        x2, y2 = points[i]
-        # Calculate slope (delta_y / delta_x)
-        if x2 != x1:  # Prevent division by zero
-            slope = (y2 - y1) / (x2 - x1)
-            if slope > 0:
-                positive_slopes.append(slope)
-            else:
-                negative_slopes.append(slope)
+def enforce_endpoint_rules(peaks, troughs, length):
+    """Treat the first frame as a trough and close the series on the last frame."""
+    if 0 not in troughs:
+        troughs = np.append([0], troughs)
+    if len(peaks) > 0 and len(troughs) > 0:
+        if peaks[-1] > troughs[-1]:
+            if length - 1 not in troughs:
+                troughs = np.append(troughs, [length - 1])
         else:
-            print("Vertical line detected, slope considered as infinite.")
+            if length - 1 not in peaks:
+                peaks = np.append(peaks, [length - 1])
+    return peaks, troughs
+
+def select_by_distance(peaks, heights, distance):
+    """Mask of the `peaks` (sorted sample indices) that find_peaks' `distance` rule keeps.
+
+    As in scipy, the highest peak is kept first and removes every peak closer than
+    `distance`, then the highest one left, and so on. Of equal peaks the earliest goes
+    first; scipy's order for those depends on its sort, so tracked boxes, which are whole
+    pixels and often tie, would otherwise give different extrema on different paths.
+    """
+    peaks = np.asarray(peaks)
+    keep = np.ones(len(peaks), dtype=bool)
+    reach = math.ceil(distance)
+    for j in np.lexsort((peaks, -np.asarray(heights))):
+        if keep[j]:
+            keep[np.searchsorted(peaks, peaks[j] - reach, side='right'):j] = False
+            keep[j + 1:np.searchsorted(peaks, peaks[j] + reach, side='left')] = False
+    return keep
+
+def find_extrema(y, distance=100, prominence=100):
+    """find_peaks(y, distance=distance, prominence=prominence), with ties broken by select_by_distance."""
+    from scipy.signal import find_peaks, peak_prominences  # Slow to import, only needed once there is data
+
+    y = np.asarray(y, dtype=float)
+    peaks, _ = find_peaks(y)
+    peaks = peaks[select_by_distance(peaks, y[peaks], distance)]
+    return peaks[peak_prominences(y, peaks)[0] >= prominence]
+
+def find_peaks_and_troughs(y, distance=100, prominence=100):
+    """Find peaks and troughs in pixel-scaled y-center data, including the first/last frame rules."""
+    y = np.asarray(y, dtype=float)
+    peaks = find_extrema(y, distance, prominence)
+    troughs = find_extrema(-y, distance, prominence)
+    return enforce_endpoint_rules(peaks, troughs, len(y))
+
+def video_fps(video, default=30.0):
+    """Frame rate from the container, or `default` when the video does not report one."""
+    import cv2
+
+    fps = video.get(cv2.CAP_PROP_FPS)
+    return fps if fps > 0 and np.isfinite(fps) else default
+
+def fit_segments(y, boundaries):
+    """Least-squares line through y on every segment between consecutive boundary frames.
+
+    Segment i covers the frames boundaries[i]..boundaries[i + 1], both ends included.
+    All segments are fitted at once from running sums over the covered samples, so
+    the cost is one pass over y whatever the number of segments. Returns a dict of
+    per-segment arrays: start, end, slope (pixels per frame), intercept (at start) and
+    rms residual in pixels.
+    """
+    boundaries = np.unique(np.asarray(boundaries, dtype=int))
+    if len(boundaries) < 2:
+        empty = np.array([])
+        return {'start': boundaries[:0], 'end': boundaries[:0], 'slope': empty, 'intercept': empty, 'rms': empty}
+
+    first = boundaries[0]
+    values = np.asarray(y, dtype=float)[first:boundaries[-1] + 1]
+    frames = np.arange(len(values))
+    sums = np.zeros((3, len(values) + 1))
+    np.cumsum(values, out=sums[0, 1:])
+    np.cumsum(frames * values, out=sums[1, 1:])
+    np.cumsum(values * values, out=sums[2, 1:])
 
-    # Calculate the median slopes
-    neg_slope_median = np.median(negative_slopes) if negative_slopes else 0
-    pos_slope_median = np.median(positive_slopes) if positive_slopes else 0
+    starts = boundaries[:-1] - first
+    stops = boundaries[1:] - first + 1
+    n = (stops - starts).astype(float)
+    sy, sty, syy = sums[:, stops] - sums[:, starts]
+    # x counts frames from the segment start, sums of x and x^2 are closed-form
+    sxy = sty - starts * sy
+    sx = n * (n - 1) / 2
+    sxx = (n - 1) * n * (2 * n - 1) / 6
+    sxx_centered = sxx - sx * sx / n
+    sxy_centered = sxy - sx * sy / n
+    slope = sxy_centered / sxx_centered
+    intercept = (sy - slope * sx) / n
+    squared_error = syy - sy * sy / n - slope * sxy_centered
+    rms = np.sqrt(np.maximum(squared_error, 0) / n)
+    return {'start': boundaries[:-1], 'end': boundaries[1:], 'slope': slope, 'intercept': intercept, 'rms': rms}
 
-    return convert_to_mm_per_sec(neg_slope_median, pos_slope_median, 30, 414.20)
+def slopes_to_velocities(slopes, fps, calibration):
+    """Median falling and rising segment slope in pixels per frame to (vu, vd) in m/s.
+
+    y grows downwards in the image, so negative slopes are the droplet rising (vu).
+    """
+    slopes = np.asarray(slopes, dtype=float)
+    positive = slopes[slopes > 0]
+    negative = slopes[slopes <= 0]
+    neg_slope_median = np.median(negative) if len(negative) else 0
+    pos_slope_median = np.median(positive) if len(positive) else 0
+    return convert_to_mm_per_sec(neg_slope_median, pos_slope_median, fps, calibration)
+
+def find_velocities(y, peaks, troughs, fps, calibration):
+    """(vu, vd) of a whole y-center series in pixels from its peaks and troughs."""
+    segments = fit_segments(y, np.concatenate([peaks, troughs]))
+    return slopes_to_velocities(segments['slope'], fps, calibration)
 
 def convert_to_mm_per_sec(negative, positive, fps, calibration):
     # Convert slopes to mm/s
     negative = np.abs((negative * fps) / calibration)
     positive = np.abs((positive * fps) / calibration)
-    return negative * 1e-3, positive * 1e-3  # Convert to m/s
\ No newline at end of file
+    return negative * 1e-3, positive * 1e-3  # Convert to m/s
+
+def read_frame_at(video, index, position, max_grab=30):
+    """Decode frame `index` given the capture's current `position` (None if unknown).
+
+    Frames a short distance ahead are reached with sequential grab() calls instead of a
+    seek, which on .mov files means a keyframe seek plus re-decode.
+    """
+    import cv2
+
+    if position is not None and position <= index <= position + max_grab:
+        for _ in range(index - position):
+            video.grab()
+    else:
+        video.set(cv2.CAP_PROP_POS_FRAMES, index)
+    return video.read()
+
+def expand_limits(limits, low, high, margin=0.05):
+    """Grow-only axis limits: None while [low, high] fits in `limits`, otherwise padded limits that contain it."""
+    lower, upper = sorted(limits)
+    if lower <= low and high <= upper:
+        return None
+    low, high = min(low, lower), max(high, upper)
+    pad = (high - low) * margin or 0.5
+    return low - pad, high + pad
+
+def equation_image(latex, cache_dir, fontsize=16, dpi=100):
+    """Path of a PNG of the mathtext `latex`, rendered on first use and then read from `cache_dir`.
+
+    Files are keyed by the source string and the rendering settings, so editing an
+    equation renders it again and the old image is simply no longer used.
+    """
+    key = hashlib.sha1(f"{latex}|{fontsize}|{dpi}".encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"{key}.png")
+    if not os.path.exists(path):
+        # matplotlib is only imported when an equation has to be rendered
+        from matplotlib import mathtext
+        from matplotlib.font_manager import FontProperties
+
+        os.makedirs(cache_dir, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"  # Complete before it appears under its key
+        mathtext.math_to_image(latex, temporary, prop=FontProperties(size=fontsize), dpi=dpi, format='png')
+        os.replace(temporary, path)
+    return path
+
+def scaled_image(path, size, cache_dir):
+    """Path of a copy of the image at `path` resized to `size`, made on first use and then read from `cache_dir`."""
+    from PIL import Image
+
+    stat = os.stat(path)
+    key = hashlib.sha1(f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{size}".encode()).hexdigest()[:16]
+    cached = os.path.join(cache_dir, f"{key}.png")
+    if not os.path.exists(cached):
+        os.makedirs(cache_dir, exist_ok=True)
+        temporary = f"{cached}.{os.getpid()}.tmp"
+        Image.open(path).resize(size, Image.Resampling.LANCZOS).save(temporary, format='png')
+        os.replace(temporary, cached)
+    return cached